@@ -1,21 +1,161 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+import logging
+import queue
+import threading
+import time
 import clickhouse_connect
+from clickhouse_connect.driver import httputil
 from .config import settings
 
+logger = logging.getLogger("teleboard")
+
 # PostgreSQL
 engine = create_async_engine(settings.DATABASE_URL)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 Base = declarative_base()
 
 # ClickHouse
+class ClickHousePool:
+    """
+    Fixed-size pool of long-lived ClickHouse clients sharing one keep-alive
+    HTTP connection pool. Exposes the `query`/`command`/`insert` subset of the
+    clickhouse_connect client API, so callers can use it as a drop-in client.
+    """
+
+    def __init__(self, size: int, healthcheck_interval: float, acquire_timeout: float, **client_kwargs):
+        self.size = size
+        self.healthcheck_interval = healthcheck_interval
+        self.acquire_timeout = acquire_timeout
+        self.client_kwargs = client_kwargs
+
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pool_mgr = None
+        self._created = 0
+        self._in_use = 0
+        self._replaced = 0
+
+    def _new_client(self):
+        with self._lock:
+            if self._pool_mgr is None:
+                self._pool_mgr = httputil.get_pool_manager(
+                    keep_idle=settings.CLICKHOUSE_KEEPALIVE_IDLE,
+                    maxsize=self.size,
+                    num_pools=1,
+                )
+            self._created += 1
+        return clickhouse_connect.get_client(pool_mgr=self._pool_mgr, **self.client_kwargs)
+
+    def open(self, warm: int = 1):
+        """Creates up to `warm` clients ahead of the first request."""
+        clients = []
+        try:
+            for _ in range(min(warm, self.size)):
+                clients.append(self._checkout())
+        finally:
+            for client, _ in clients:
+                self._checkin(client)
+
+    def close(self):
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No ClickHouse client available after {self.acquire_timeout}s")
+        try:
+            try:
+                client, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                client, last_used = self._new_client(), time.monotonic()
+
+            if time.monotonic() - last_used > self.healthcheck_interval and not client.ping():
+                logger.warning("ClickHouse client failed health check, reconnecting")
+                try:
+                    client.close()
+                except Exception:
+                    pass
+                client = self._new_client()
+                self._replaced += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return client, last_used
+
+    def _checkin(self, client):
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put((client, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        client, _ = self._checkout()
+        try:
+            yield client
+        finally:
+            self._checkin(client)
+
+    def _merge_settings(self, overrides: Optional[Dict[str, Any]]):
+        return {**settings.CLICKHOUSE_QUERY_SETTINGS, **(overrides or {})} or None
+
+    def query(self, query: str, parameters=None, settings: Optional[Dict[str, Any]] = None, **kwargs):
+        with self.connection() as client:
+            return client.query(query, parameters=parameters, settings=self._merge_settings(settings), **kwargs)
+
+    def command(self, cmd: str, parameters=None, settings: Optional[Dict[str, Any]] = None, **kwargs):
+        with self.connection() as client:
+            return client.command(cmd, parameters=parameters, settings=self._merge_settings(settings), **kwargs)
+
+    def insert(self, table: str, data, settings: Optional[Dict[str, Any]] = None, **kwargs):
+        with self.connection() as client:
+            return client.insert(table, data, settings=self._merge_settings(settings), **kwargs)
+
+    def ping(self) -> bool:
+        try:
+            with self.connection() as client:
+                return client.ping()
+        except Exception:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": self._idle.qsize(),
+            "in_use": self._in_use,
+            "replaced": self._replaced,
+        }
+
+clickhouse_pool = ClickHousePool(
+    size=settings.CLICKHOUSE_POOL_SIZE,
+    healthcheck_interval=settings.CLICKHOUSE_HEALTHCHECK_INTERVAL,
+    acquire_timeout=settings.CLICKHOUSE_ACQUIRE_TIMEOUT,
+    host=settings.CLICKHOUSE_HOST,
+    port=settings.CLICKHOUSE_PORT,
+    username=settings.CLICKHOUSE_USER,
+    password=settings.CLICKHOUSE_PASSWORD,
+    compress=settings.CLICKHOUSE_COMPRESS,
+    connect_timeout=settings.CLICKHOUSE_CONNECT_TIMEOUT,
+    send_receive_timeout=settings.CLICKHOUSE_QUERY_TIMEOUT,
+)
+
 def get_clickhouse_client():
-    return clickhouse_connect.get_client(
-        host=settings.CLICKHOUSE_HOST,
-        port=settings.CLICKHOUSE_PORT,
-        username=settings.CLICKHOUSE_USER,
-        password=settings.CLICKHOUSE_PASSWORD
-    )
+    """Returns the shared ClickHouse pool; connections are created lazily."""
+    return clickhouse_pool
 
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -0,0 +1,13 @@
+from .buffer import IngestBuffer, TELEMETRY_COLUMNS, HEATMAP_COLUMNS, telemetry_buffer, bot_buffer, heatmap_buffer
+from .useragent import parse_user_agent
+from .geoip import geoip
+from .urls import split_url, ref_domain, normalize_path
+from .heatmap import HEATMAP_EVENT, BIN_COLUMNS, BIN_ROW_PX, VIEWPORTS, decode_clicks
+from .bots import BotClassifier, bot_classifier
+from .sampling import in_sample, WEIGHTED_EVENTS, WEIGHTED_SESSIONS, SESSION_WEIGHT
+from .admission import AdmissionController, admission, event_priority, PRIORITY_HIGH
+from .dedup import EventDeduplicator, event_dedup
+from .spool import DiskSpool
+from .proxy import TrustedProxies, client_ip
+from .compression import decompress_body, read_body
+from .schema import Beacon, Batch, decode_beacon, decode_batch
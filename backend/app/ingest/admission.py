@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Optional
+
+from ..config import settings
+from ..redis_pool import redis_client
+from .buffer import telemetry_buffer
+
+logger = logging.getLogger("teleboard")
+
+PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW = 0, 1, 2
+
+# Page views and custom (conversion) events are high priority; these go first
+LOW_PRIORITY_EVENTS = frozenset({"heatmap_batch", "click"})
+NORMAL_PRIORITY_EVENTS = frozenset({"page_exit"})
+
+# Share of a resource's bucket that only higher classes may spend, so a burst
+# of clicks can't use up the tokens page views need
+BUCKET_RESERVE = {PRIORITY_HIGH: 0.0, PRIORITY_NORMAL: 0.2, PRIORITY_LOW: 0.5}
+# Ingest pressure at which a class is shed outright
+SHED_PRESSURE = {PRIORITY_NORMAL: 0.9, PRIORITY_LOW: 0.5}
+
+
+def event_priority(event_type: str) -> int:
+    if event_type in LOW_PRIORITY_EVENTS:
+        return PRIORITY_LOW
+    if event_type in NORMAL_PRIORITY_EVENTS:
+        return PRIORITY_NORMAL
+    return PRIORITY_HIGH
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, n: float = 1, reserve: float = 0.0) -> bool:
+        """Spends `n` tokens unless that would leave less than `reserve` of the burst."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens - n < self.burst * reserve:
+            return False
+        self.tokens -= n
+        return True
+
+
+class AdmissionController:
+    """
+    Admission control for the collect endpoints, all in process so a decision
+    costs a dict lookup and some arithmetic.
+
+    Requests are limited per IP and events per resource with token buckets.
+    Low priority events are shed first, both as a resource's bucket drains
+    and as the ingest queue fills. Every `sync_interval` seconds each process
+    adds its per-resource usage to a shared Redis counter; resources over
+    their cluster-wide rate only admit high priority events until the next sync.
+    """
+
+    def __init__(self, resource_rate: float, resource_burst: float, ip_rate: float, ip_burst: float,
+                 max_ips: int, sync_interval: float, pressure: Optional[Callable[[], float]] = None):
+        self.resource_rate = resource_rate
+        self.resource_burst = resource_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.max_ips = max_ips
+        self.sync_interval = sync_interval
+        self.pressure = pressure or (lambda: 0.0)
+
+        self._resources: Dict[str, TokenBucket] = {}
+        self._ips: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._used: Dict[str, int] = defaultdict(int)
+        self._throttled = set()
+        self._task: Optional[asyncio.Task] = None
+
+        self.admitted = 0
+        self.shed = 0
+        self.limited = 0
+
+    def admit_ip(self, ip: str) -> bool:
+        bucket = self._ips.get(ip)
+        if bucket is None:
+            bucket = self._ips[ip] = TokenBucket(self.ip_rate, self.ip_burst)
+            if len(self._ips) > self.max_ips:
+                self._ips.popitem(last=False)
+        else:
+            self._ips.move_to_end(ip)
+        if bucket.take():
+            return True
+        self.limited += 1
+        return False
+
+    def admit(self, rid: str, priority: int) -> bool:
+        if priority != PRIORITY_HIGH and (rid in self._throttled or self.pressure() >= SHED_PRESSURE[priority]):
+            self.shed += 1
+            return False
+        bucket = self._resources.get(rid)
+        if bucket is None:
+            bucket = self._resources[rid] = TokenBucket(self.resource_rate, self.resource_burst)
+        if not bucket.take(1, BUCKET_RESERVE[priority]):
+            if priority == PRIORITY_HIGH:
+                self.limited += 1
+            else:
+                self.shed += 1
+            return False
+        self._used[rid] += 1
+        self.admitted += 1
+        return True
+
+    async def sync(self):
+        used, self._used = self._used, defaultdict(int)
+        if not used:
+            self._throttled = set()
+            return
+        slot = int(time.time() // self.sync_interval)
+        keys = [f"ot:ratelimit:{rid}:{slot}" for rid in used]
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, count in zip(keys, used.values()):
+                pipe.incrby(key, count)
+                pipe.expire(key, int(self.sync_interval * 2) + 1)
+            results = await pipe.execute()
+        limit = self.resource_rate * self.sync_interval
+        totals = results[::2]
+        self._throttled = {rid for rid, total in zip(used, totals) if total > limit}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                # Without the shared view, fall back to the local buckets alone
+                self._throttled = set()
+                logger.error(f"Rate limit sync failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "limited": self.limited,
+            "throttled_resources": len(self._throttled),
+            "tracked_ips": len(self._ips),
+        }
+
+
+admission = AdmissionController(
+    resource_rate=settings.RATE_LIMIT_RESOURCE_EPS,
+    resource_burst=settings.RATE_LIMIT_RESOURCE_BURST,
+    ip_rate=settings.RATE_LIMIT_IP_RPS,
+    ip_burst=settings.RATE_LIMIT_IP_BURST,
+    max_ips=settings.RATE_LIMIT_MAX_TRACKED_IPS,
+    sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL,
+    pressure=telemetry_buffer.pressure,
+)
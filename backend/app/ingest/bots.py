@@ -0,0 +1,129 @@
+import bisect
+import ipaddress
+import logging
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger("teleboard")
+
+# Crawlers, link previewers, monitors, headless/automation drivers and HTTP libraries.
+# One alternation so a user agent is checked with a single regex search. "bot" only
+# counts as a product token (Googlebot/2.1, AdsBot-Google, compatible; FooBot): phone
+# models such as "CUBOT P30" and the YandexSearch app browser are people.
+BOT_UA_PATTERN = re.compile(
+    r"\w*bot/|\w+bot-|compatible; ?\w*bot\b|crawl|spider|slurp|scrape|archiver|"
+    r"headless|phantomjs|puppeteer|playwright|selenium|webdriver|"
+    r"lighthouse|pagespeed|pingdom|uptimerobot|statuscake|site24x7|gtmetrix|"
+    r"facebookexternalhit|facebookcatalog|bingpreview|whatsapp|telegrambot|slackbot|discordbot|"
+    r"ahrefs|semrush|mj12|dotbot|petalbot|bytespider|yandex(?:bot|\.com/bots)|baiduspider|applebot|"
+    r"gptbot|chatgpt|claudebot|anthropic|ccbot|perplexity|"
+    r"curl/|wget/|httpie|python-requests|python-urllib|aiohttp|httpx|okhttp|go-http-client|"
+    r"java/|apache-httpclient|libwww|node-fetch|axios/",
+    re.IGNORECASE,
+)
+
+
+class BotClassifier:
+    """
+    Flags automated traffic at ingest with three cheap checks: the user agent
+    against BOT_UA_PATTERN (cached per agent), the IP against sorted CIDR
+    ranges (binary search), and the event rate of the session.
+
+    A session that sends more than `max_events_per_minute` events in a minute
+    stays flagged for as long as it is tracked.
+    """
+
+    def __init__(self, ip_ranges_path: str, max_events_per_minute: int, max_sessions: int):
+        self.max_events_per_minute = max_events_per_minute
+        self.max_sessions = max_sessions
+        self._ranges = {4: ([], []), 6: ([], [])}
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self.flagged = 0
+        if ip_ranges_path:
+            self.load_ip_ranges(ip_ranges_path)
+
+    def load_ip_ranges(self, path: str):
+        """Loads one CIDR per line; blank lines and `#` comments are ignored."""
+        networks = {4: [], 6: []}
+        try:
+            with open(path) as f:
+                for line in f:
+                    line = line.split("#", 1)[0].strip()
+                    if not line:
+                        continue
+                    try:
+                        net = ipaddress.ip_network(line, strict=False)
+                    except ValueError:
+                        logger.warning(f"Skipping invalid bot IP range {line!r}")
+                        continue
+                    networks[net.version].append((int(net.network_address), int(net.broadcast_address)))
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"Bot IP ranges {path} could not be read: {e}")
+            return
+
+        for version, ranges in networks.items():
+            merged: List[Tuple[int, int]] = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            self._ranges[version] = ([s for s, _ in merged], [e for _, e in merged])
+        logger.info(f"Loaded {sum(len(r) for r in networks.values())} bot IP ranges from {path}")
+
+    @staticmethod
+    @lru_cache(maxsize=settings.UA_CACHE_SIZE)
+    def is_bot_agent(user_agent: str) -> bool:
+        return not user_agent or BOT_UA_PATTERN.search(user_agent) is not None
+
+    def is_bot_ip(self, ip: str) -> bool:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        starts, ends = self._ranges[addr.version]
+        if not starts:
+            return False
+        i = bisect.bisect_right(starts, int(addr)) - 1
+        return i >= 0 and int(addr) <= ends[i]
+
+    def exceeds_rate(self, session_key: str, events: int = 1) -> bool:
+        """Counts events per session in one-minute windows; True once the limit is crossed."""
+        now = time.monotonic()
+        state = self._sessions.get(session_key)
+        if state is None:
+            state = self._sessions[session_key] = [now, 0, False]
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_key)
+            if now - state[0] >= 60:
+                state[0], state[1] = now, 0
+        state[1] += events
+        if state[1] > self.max_events_per_minute:
+            state[2] = True
+        return state[2]
+
+    def classify(self, user_agent: str, ip: str, session_key: str, events: int = 1) -> bool:
+        is_bot = (
+            self.exceeds_rate(session_key, events)
+            or self.is_bot_agent(user_agent)
+            or self.is_bot_ip(ip)
+        )
+        if is_bot:
+            self.flagged += events
+        return is_bot
+
+
+bot_classifier = BotClassifier(
+    settings.BOT_IP_RANGES_FILE,
+    max_events_per_minute=settings.BOT_MAX_EVENTS_PER_MINUTE,
+    max_sessions=settings.BOT_MAX_TRACKED_SESSIONS,
+)
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..config import settings
+from ..database import get_clickhouse_client
+from .spool import DiskSpool
+
+logger = logging.getLogger("teleboard")
+
+# Column order of every row pushed into the telemetry buffer. New columns are
+# appended, so rows spooled by an older version can be padded with defaults.
+TELEMETRY_COLUMNS = [
+    "resource_id", "event_type", "url", "referrer", "user_agent", "ip", "screen_res", "lang",
+    "utm_source", "utm_medium", "utm_campaign", "fbclid", "ttclid", "session_id", "payload", "timestamp",
+    "device", "os", "browser", "country", "city", "host", "path", "canonical_path", "ref_domain",
+    "is_bot", "sample_weight", "event_id",
+]
+TELEMETRY_DEFAULTS = [""] * 15 + [None] + [""] * 9 + [0, 1.0, ""]
+
+# Column order of rows pushed into the heatmap buffer, one row per click
+HEATMAP_COLUMNS = [
+    "resource_id", "session_id", "host", "canonical_path", "url", "timestamp", "device",
+    "viewport_width", "x", "y", "t", "sample_weight",
+]
+HEATMAP_DEFAULTS = [""] * 5 + [None, "", 0, 0.0, 0, 0, 1.0]
+
+
+MAX_RETRY_BACKOFF = 30.0
+
+
+class IngestBuffer:
+    """
+    Collects rows across requests and writes them to ClickHouse in columnar
+    batches, either when `max_rows` rows are queued or every `max_age` seconds.
+
+    With a spool attached, batches that can't be written (ClickHouse down or the
+    queue full) go to disk instead of being dropped, and are replayed in order
+    once inserts succeed again. A spool that fails with an I/O error is turned
+    off and the buffer carries on in memory.
+    """
+
+    def __init__(self, table: str, columns: Sequence[str], max_rows: int, max_age: float, max_queue: int,
+                 spool: Optional[DiskSpool] = None, defaults: Optional[Sequence[Any]] = None):
+        self.table = table
+        self.columns = list(columns)
+        self.defaults = list(defaults) if defaults is not None else [None] * len(self.columns)
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.max_queue = max_queue
+        self.spool = spool
+
+        self._rows: List[Sequence[Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._spill: List[Sequence[Any]] = []
+        self.spool_error: Optional[str] = None
+        self._retry_at = 0.0
+        self._backoff = 0.0
+
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.dropped_rows = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_flush_at: Optional[float] = None
+        self.replayed_rows = 0
+        self.replay_rows_per_sec = 0.0
+
+    def add(self, row: Sequence[Any]) -> bool:
+        """Queues a row in column order. Returns False if the buffer is full."""
+        if len(self._rows) >= self.max_queue:
+            if not self._spooling() or self._spill:
+                self.dropped_rows += 1
+                return False
+            # Backpressure: hand the whole queue to the next flush, which writes it
+            # to disk ahead of newer rows, rather than refuse new rows
+            self._spill, self._rows = self._rows, []
+        self._rows.append(row)
+        if (self._spill or len(self._rows) >= self.max_rows) and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def pressure(self) -> float:
+        """Load from 0 to 1: queue fill, or 1 while inserts are failing and rows go to disk."""
+        if time.monotonic() < self._retry_at:
+            return 1.0
+        return min((len(self._rows) + len(self._spill)) / self.max_queue, 1.0)
+
+    async def flush(self) -> int:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._spill:
+                spill, self._spill = self._spill, []
+                await self._to_spool(spill)
+            if not self._rows:
+                return 0
+            rows, self._rows = self._rows, []
+
+            if self._spooling() and (time.monotonic() < self._retry_at or self.spool.pending()):
+                # Older rows are still waiting on disk; queue behind them to keep order
+                await self._to_spool(rows)
+                return 0
+
+            data = [list(col) for col in zip(*rows)]
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._insert, data)
+            except Exception as e:
+                self._insert_failed(e, len(rows))
+                await self._to_spool(rows)
+                return 0
+
+            self._insert_succeeded(started, len(rows))
+            return len(rows)
+
+    async def replay(self) -> int:
+        """Writes the oldest spooled segment to ClickHouse as one insert."""
+        if not self._spooling() or time.monotonic() < self._retry_at:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            try:
+                segment = await asyncio.to_thread(self.spool.oldest)
+            except OSError as e:
+                self._spool_failed(e)
+                return 0
+            if segment is None:
+                return 0
+            seq, rows = segment
+            width = len(self.columns)
+            rows = [row if len(row) == width else list(row[:width]) + self.defaults[len(row):] for row in rows]
+            if rows:
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._insert, [list(col) for col in zip(*rows)])
+                except Exception as e:
+                    self._insert_failed(e, len(rows))
+                    return 0
+                self._insert_succeeded(started, len(rows))
+                self.replayed_rows += len(rows)
+                self.replay_rows_per_sec = len(rows) / max(time.perf_counter() - started, 1e-6)
+            try:
+                await asyncio.to_thread(self.spool.remove, seq)
+            except OSError as e:
+                # Stop before the segment is replayed (and inserted) a second time
+                self._spool_failed(e)
+            return len(rows)
+
+    def _spooling(self) -> bool:
+        return self.spool is not None and self.spool_error is None
+
+    def _spool_failed(self, error: Exception):
+        self.spool_error = str(error)
+        logger.error(f"Ingest spool for {self.table} disabled, buffering in memory only: {error}")
+
+    def _requeue(self, rows: List[Sequence[Any]]):
+        """Puts rows back in front of newer ones while there is room for them."""
+        room = self.max_queue - len(self._rows)
+        if room > 0:
+            self._rows[:0] = rows[:room]
+        self.dropped_rows += max(0, len(rows) - max(room, 0))
+
+    async def _to_spool(self, rows: List[Sequence[Any]]):
+        if not self._spooling():
+            self._requeue(rows)
+            return
+        try:
+            written = await asyncio.to_thread(self.spool.append, rows)
+        except OSError as e:
+            self._spool_failed(e)
+            self._requeue(rows)
+            return
+        except Exception as e:
+            logger.error(f"Ingest spool write failed ({len(rows)} rows): {e}")
+            written = 0
+        self.dropped_rows += len(rows) - written
+
+    def _insert_failed(self, error: Exception, count: int):
+        self.failed_flushes += 1
+        self._backoff = min(max(self._backoff * 2, self.max_age), MAX_RETRY_BACKOFF)
+        self._retry_at = time.monotonic() + self._backoff
+        logger.error(f"Ingest flush to {self.table} failed ({count} rows), retrying in {self._backoff:.0f}s: {error}")
+
+    def _insert_succeeded(self, started: float, count: int):
+        elapsed = (time.perf_counter() - started) * 1000
+        self._backoff = 0.0
+        self.flushed_rows += count
+        self.flushed_batches += 1
+        self.last_flush_ms = elapsed
+        self.total_flush_ms += elapsed
+        self.last_flush_at = time.time()
+
+    def _insert(self, data: List[List[Any]]):
+        client = get_clickhouse_client()
+        client.insert(self.table, data, column_names=self.columns, column_oriented=True)
+
+    async def _run(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_age)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+
+                # Drain the spool for at most one flush interval so new rows aren't held back
+                deadline = time.monotonic() + self.max_age
+                while self._running and time.monotonic() < deadline and not self._wakeup.is_set():
+                    if not await self.replay():
+                        break
+            except Exception as e:
+                # The loop must outlive any one bad iteration, or queued rows are never written
+                logger.error(f"Ingest buffer loop error for {self.table}: {e}")
+                await asyncio.sleep(self.max_age)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._wakeup.set()
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Ingest buffer task error: {e}")
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "queued": len(self._rows) + len(self._spill),
+            "max_queue": self.max_queue,
+            "flushed_rows": self.flushed_rows,
+            "flushed_batches": self.flushed_batches,
+            "dropped_rows": self.dropped_rows,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushed_batches, 2) if self.flushed_batches else 0,
+            "last_flush_at": self.last_flush_at,
+            "replayed_rows": self.replayed_rows,
+            "replay_rows_per_sec": round(self.replay_rows_per_sec, 1),
+            "spool": self.spool.stats() if self.spool is not None else None,
+            "spool_error": self.spool_error,
+        }
+
+
+def _buffer(table: str, columns: Sequence[str], defaults: Sequence[Any], spool_dir: str) -> IngestBuffer:
+    return IngestBuffer(
+        table,
+        columns,
+        defaults=defaults,
+        max_rows=settings.INGEST_BATCH_SIZE,
+        max_age=settings.INGEST_FLUSH_INTERVAL,
+        max_queue=settings.INGEST_MAX_QUEUE,
+        spool=DiskSpool(
+            spool_dir,
+            segment_bytes=settings.INGEST_SPOOL_SEGMENT_BYTES,
+            max_bytes=settings.INGEST_SPOOL_MAX_BYTES,
+        ) if settings.INGEST_SPOOL_DIR else None,
+    )
+
+
+def _telemetry_buffer(table: str, spool_dir: str) -> IngestBuffer:
+    return _buffer(table, TELEMETRY_COLUMNS, TELEMETRY_DEFAULTS, spool_dir)
+
+
+telemetry_buffer = _telemetry_buffer("telemetry", settings.INGEST_SPOOL_DIR)
+# Rows classified as bots, for resources whose bot_policy is "separate"
+bot_buffer = _telemetry_buffer("telemetry_bots", os.path.join(settings.INGEST_SPOOL_DIR, "bots"))
+# Heatmap clicks, kept out of telemetry
+heatmap_buffer = _buffer("heatmap_clicks", HEATMAP_COLUMNS, HEATMAP_DEFAULTS, os.path.join(settings.INGEST_SPOOL_DIR, "heatmap"))
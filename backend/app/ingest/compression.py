@@ -0,0 +1,69 @@
+import io
+import zlib
+import zstandard
+from fastapi import HTTPException, Request
+from ..config import settings
+
+_zstd = zstandard.ZstdDecompressor()
+
+
+def _inflate(data: bytes, wbits: int, limit: int) -> bytes:
+    decompressor = zlib.decompressobj(wbits)
+    out = decompressor.decompress(data, limit + 1)
+    if len(out) > limit or decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Decompressed body too large")
+    return out
+
+
+def decompress_body(data: bytes, encoding: str, limit: int) -> bytes:
+    """
+    Decodes a request body according to its Content-Encoding, never producing
+    more than `limit` bytes so a small compressed payload can't expand unbounded.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    try:
+        if encoding in ("", "identity"):
+            out = data
+        elif encoding in ("gzip", "x-gzip"):
+            out = _inflate(data, 16 + zlib.MAX_WBITS, limit)
+        elif encoding == "deflate":
+            # RFC 9110 deflate is zlib-wrapped, but raw deflate is common in the wild
+            try:
+                out = _inflate(data, zlib.MAX_WBITS, limit)
+            except zlib.error:
+                out = _inflate(data, -zlib.MAX_WBITS, limit)
+        elif encoding == "zstd":
+            parts, size = [], 0
+            with _zstd.stream_reader(io.BytesIO(data)) as reader:
+                while size <= limit:
+                    part = reader.read(64 * 1024)
+                    if not part:
+                        break
+                    parts.append(part)
+                    size += len(part)
+            out = b"".join(parts)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    except (zlib.error, zstandard.ZstdError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+
+    if len(out) > limit:
+        raise HTTPException(status_code=413, detail="Request body too large")
+    return out
+
+
+async def read_body(request: Request) -> bytes:
+    """Reads a size-limited, optionally compressed request body."""
+    max_raw = settings.INGEST_MAX_COMPRESSED_BYTES
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_raw:
+        raise HTTPException(status_code=413, detail="Request body too large")
+
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_raw:
+            raise HTTPException(status_code=413, detail="Request body too large")
+        chunks.append(chunk)
+
+    return decompress_body(b"".join(chunks), request.headers.get("content-encoding", ""), settings.INGEST_MAX_BODY_BYTES)
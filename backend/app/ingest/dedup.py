@@ -0,0 +1,95 @@
+import hashlib
+import math
+import time
+from typing import Dict
+
+from ..config import settings
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray, using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return len(self._array)
+
+    def positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def contains(self, positions) -> bool:
+        array = self._array
+        return all(array[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, positions):
+        array = self._array
+        for p in positions:
+            array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class EventDeduplicator:
+    """
+    Remembers client event ids for roughly `window` seconds to drop resent beacons.
+
+    Two Bloom filters each cover half the window; the older one is discarded on
+    rotation, so memory is fixed at about 10-15 bits per event the window can
+    hold, whatever the traffic. A false positive drops a genuine event with
+    probability `error_rate`.
+
+    Ingest checks an id with `seen` and calls `record` only once the event is
+    queued, so an event refused under backpressure can still be retried.
+    """
+
+    def __init__(self, window: float, capacity: int, error_rate: float):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+        self.duplicates = 0
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._rotated_at >= self.window / 2 or self._current.count >= self.capacity:
+            self._previous, self._current = self._current, BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = now
+
+    def seen(self, resource_id: str, event_id: str) -> bool:
+        """Returns True (and counts a duplicate) if the event was recorded in the window."""
+        if not event_id:
+            return False
+        self._rotate()
+        positions = self._current.positions(f"{resource_id}:{event_id}".encode())
+        if self._current.contains(positions) or self._previous.contains(positions):
+            self.duplicates += 1
+            return True
+        return False
+
+    def record(self, resource_id: str, event_id: str):
+        if not event_id:
+            return
+        self._rotate()
+        self._current.add(self._current.positions(f"{resource_id}:{event_id}".encode()))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "duplicates": self.duplicates,
+            "window_events": self._current.count + self._previous.count,
+            "memory_bytes": len(self._current) + len(self._previous),
+        }
+
+
+event_dedup = EventDeduplicator(
+    window=settings.DEDUP_WINDOW,
+    capacity=settings.DEDUP_CAPACITY,
+    error_rate=settings.DEDUP_ERROR_RATE,
+)
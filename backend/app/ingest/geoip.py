@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import maxminddb
+
+from ..config import settings
+
+logger = logging.getLogger("teleboard")
+
+UNKNOWN = ("", "")
+
+
+class GeoIPResolver:
+    """
+    Resolves IPs to (country ISO code, city) from a local MaxMind-format database.
+
+    Lookups are cached per IP. The file's mtime is checked every
+    `check_interval` seconds and the database is reopened when it changes, so
+    a refreshed GeoLite2 file is picked up without a restart.
+    """
+
+    def __init__(self, path: str, cache_size: int, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self._reader: Optional[maxminddb.Reader] = None
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._cached_lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.path.getmtime(self.path) if self.path else None
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+
+            old, self._reader = self._reader, None
+            if mtime is not None:
+                try:
+                    self._reader = maxminddb.open_database(self.path)
+                    logger.info(f"Loaded GeoIP database {self.path}")
+                except Exception as e:
+                    logger.error(f"GeoIP database {self.path} could not be opened: {e}")
+            self._mtime = mtime
+            self._cached_lookup.cache_clear()
+            if old is not None:
+                old.close()
+
+    def _lookup(self, ip: str) -> Tuple[str, str]:
+        reader = self._reader
+        if reader is None:
+            return UNKNOWN
+        try:
+            record = reader.get(ip)
+        except ValueError:
+            return UNKNOWN
+        if not record:
+            return UNKNOWN
+        country = (record.get("country") or record.get("registered_country") or {}).get("iso_code", "")
+        city = ((record.get("city") or {}).get("names") or {}).get("en", "")
+        return country, city
+
+    def lookup(self, ip: str) -> Tuple[str, str]:
+        self._maybe_reload()
+        return self._cached_lookup(ip)
+
+    def location(self, ip: str) -> Optional[Tuple[float, float]]:
+        """Returns (lat, lng) for an IP, if the database has coordinates for it."""
+        self._maybe_reload()
+        reader = self._reader
+        if reader is None:
+            return None
+        try:
+            record = reader.get(ip) or {}
+        except ValueError:
+            return None
+        loc = record.get("location") or {}
+        if "latitude" in loc and "longitude" in loc:
+            return loc["latitude"], loc["longitude"]
+        return None
+
+
+geoip = GeoIPResolver(settings.GEOIP_DB_PATH, settings.GEOIP_CACHE_SIZE, settings.GEOIP_CHECK_INTERVAL)
@@ -0,0 +1,77 @@
+import base64
+import binascii
+from typing import Iterator, List, Optional, Tuple
+
+import msgspec
+from fastapi import HTTPException
+
+HEATMAP_EVENT = "heatmap_batch"
+MAX_CLICKS = 500
+# x is sent in thousandths of the viewport width
+X_SCALE = 1000
+MAX_UINT32 = 2 ** 32 - 1
+
+# Base grid of the daily heatmap_bins rollup; requested grids are coarser multiples
+BIN_COLUMNS = 200
+BIN_ROW_PX = 10
+# Viewports narrower than this are binned as "mobile", the rest (and unknown) as "desktop"
+MOBILE_MAX_WIDTH = 1024
+VIEWPORTS = ("desktop", "mobile")
+
+
+class LegacyClick(msgspec.Struct):
+    x: float = 0.0
+    y: float = 0.0
+    t: float = 0.0
+
+
+class HeatmapMeta(msgspec.Struct):
+    """
+    Meta of a `heatmap_batch` event. Current SDKs send `c`: per click, varints
+    of x (thousandths of the viewport width), the zigzag delta of y from the
+    previous click (page px) and the delta of t (ms since page load), base64url
+    encoded, with the viewport width in `w`. Older SDKs sent a `clicks` list.
+    """
+    v: int = 0
+    w: int = 0
+    c: str = ""
+    clicks: Optional[List[LegacyClick]] = None
+
+
+_meta_decoder = msgspec.json.Decoder(HeatmapMeta)
+
+
+def _varints(data: bytes) -> Iterator[int]:
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            if shift > 35:
+                raise ValueError("varint too long")
+        else:
+            yield value
+            value = shift = 0
+    if shift:
+        raise ValueError("truncated varint")
+
+
+def decode_clicks(meta: bytes) -> Tuple[int, List[Tuple[float, int, int]]]:
+    """Returns (viewport width, [(x fraction, y px, t ms)]) from a heatmap_batch meta."""
+    try:
+        data = _meta_decoder.decode(meta)
+        if data.clicks is not None:
+            clicks = [(min(max(c.x, 0.0), 1.0), min(max(int(c.y), 0), MAX_UINT32), min(max(int(c.t), 0), MAX_UINT32))
+                      for c in data.clicks[:MAX_CLICKS]]
+            return 0, clicks
+        values = list(_varints(base64.urlsafe_b64decode(data.c + "=" * (-len(data.c) % 4))))
+    except (msgspec.DecodeError, binascii.Error, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid heatmap batch: {e}")
+
+    clicks, y, t = [], 0, 0
+    for i in range(0, min(len(values), MAX_CLICKS * 3) - 2, 3):
+        x, dy, dt = values[i:i + 3]
+        y = max(y + ((dy >> 1) ^ -(dy & 1)), 0)
+        t += dt
+        clicks.append((min(x, X_SCALE) / X_SCALE, min(y, MAX_UINT32), min(t, MAX_UINT32)))
+    return min(max(data.w, 0), 65535), clicks
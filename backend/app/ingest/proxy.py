@@ -0,0 +1,56 @@
+import ipaddress
+import logging
+from typing import List, Optional
+
+from fastapi import Request
+
+from ..config import settings
+
+logger = logging.getLogger("teleboard")
+
+
+class TrustedProxies:
+    """
+    Resolves the visitor's address behind reverse proxies. Forwarding headers
+    are only believed when the peer is a trusted proxy: X-Forwarded-For is
+    walked right to left past trusted hops, then X-Real-IP is used, so a
+    visitor can't pick an address by sending the headers themselves.
+    """
+
+    def __init__(self, networks: str):
+        self.networks: List[ipaddress._BaseNetwork] = []
+        for spec in networks.split(","):
+            spec = spec.strip()
+            if not spec:
+                continue
+            try:
+                self.networks.append(ipaddress.ip_network(spec, strict=False))
+            except ValueError:
+                logger.warning(f"Skipping invalid trusted proxy {spec!r}")
+
+    def is_trusted(self, ip: Optional[str]) -> bool:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except (TypeError, ValueError):
+            return False
+        return any(addr in net for net in self.networks)
+
+    def client_ip(self, request: Request) -> str:
+        peer = request.client.host if request.client else ""
+        if not self.is_trusted(peer):
+            return peer
+        forwarded = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        for hop in reversed(forwarded):
+            if not self.is_trusted(hop):
+                return hop
+        real_ip = request.headers.get("x-real-ip", "").strip()
+        if real_ip:
+            return real_ip
+        return forwarded[0] if forwarded else peer
+
+
+trusted_proxies = TrustedProxies(settings.TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    return trusted_proxies.client_ip(request)
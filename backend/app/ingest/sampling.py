@@ -0,0 +1,19 @@
+import zlib
+
+# Read-side aggregates that scale sampled rows back up by their sample_weight.
+# Sampling keeps or drops whole sessions, so every row of a session has the same weight.
+WEIGHTED_EVENTS = "toUInt64(round(sum(sample_weight)))"
+# Sessions count once each: take one weight per session (GROUP BY session_id) in a
+# subquery, then sum those weights over its `session_weight` column
+SESSION_WEIGHT = "any(sample_weight)"
+WEIGHTED_SESSIONS = "toUInt64(round(sum(session_weight)))"
+
+
+def in_sample(session_id: str, rate: float) -> bool:
+    """
+    Deterministically keeps `rate` of all sessions: every event of a session
+    hashes to the same bucket, so sampled sessions stay complete.
+    """
+    if rate >= 1:
+        return True
+    return zlib.crc32(session_id.encode()) < rate * 0x100000000
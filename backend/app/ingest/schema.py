@@ -0,0 +1,134 @@
+import datetime
+from typing import Annotated, List, Optional, Tuple
+
+import msgspec
+from fastapi import HTTPException
+
+from ..config import settings
+from .geoip import geoip
+from .heatmap import decode_clicks
+from .urls import ref_domain, split_url
+from .useragent import parse_user_agent
+
+# Field limits; anything longer is rejected by the decoder before a row is built
+Id = Annotated[str, msgspec.Meta(max_length=128)]
+Name = Annotated[str, msgspec.Meta(max_length=128)]
+Url = Annotated[str, msgspec.Meta(max_length=2048)]
+Short = Annotated[str, msgspec.Meta(max_length=64)]
+Param = Optional[Annotated[str, msgspec.Meta(max_length=512)]]
+
+MAX_BATCH_EVENTS = 100
+MAX_EVENT_DELAY_MS = 3600 * 1000
+EMPTY_META = msgspec.Raw(b"{}")
+
+
+class Beacon(msgspec.Struct):
+    """A single event posted to /api/v1/collect, using the SDK's compact field names."""
+    rid: Id = ""
+    sid: Optional[Id] = None
+    session_id: Optional[Id] = None
+    type: Name = "page_view"
+    url: Url = ""
+    ref: Url = ""
+    res: Short = ""
+    lang: Short = ""
+    utm_s: Param = None
+    utm_m: Param = None
+    utm_c: Param = None
+    fbclid: Param = None
+    ttclid: Param = None
+    # Client-generated event id, used to drop resent beacons
+    eid: Optional[Id] = None
+    # Kept as raw JSON so it is stored without a decode/encode round trip
+    meta: msgspec.Raw = EMPTY_META
+
+    @property
+    def session(self) -> str:
+        return self.sid or self.session_id or "unknown"
+
+    def row(self, user_agent: str, ip: str, timestamp: datetime.datetime,
+            is_bot: bool = False, sample_weight: float = 1.0) -> Tuple:
+        """Builds a telemetry row in TELEMETRY_COLUMNS order."""
+        return (
+            self.rid, self.type, self.url, self.ref, user_agent, ip, self.res, self.lang,
+            self.utm_s or "", self.utm_m or "", self.utm_c or "", self.fbclid or "", self.ttclid or "",
+            self.session, meta_json(self.meta), timestamp,
+            *parse_user_agent(user_agent),
+            *geoip.lookup(ip),
+            *split_url(self.url), ref_domain(self.ref),
+            int(is_bot), sample_weight, self.eid or "",
+        )
+
+    def heatmap_rows(self, user_agent: str, timestamp: datetime.datetime, sample_weight: float = 1.0) -> List[Tuple]:
+        """Builds heatmap_clicks rows in HEATMAP_COLUMNS order from a heatmap_batch event."""
+        width, clicks = decode_clicks(bytes(self.meta))
+        if not width:
+            # Older SDKs sent no viewport width; the screen width is the closest we have
+            screen_width = self.res.partition("x")[0]
+            width = min(int(screen_width), 65535) if screen_width.isdigit() else 0
+        host, _, canonical_path = split_url(self.url)
+        device = parse_user_agent(user_agent)[0]
+        return [
+            (self.rid, self.session, host, canonical_path, self.url, timestamp, device, width, x, y, t, sample_weight)
+            for x, y, t in clicks
+        ]
+
+
+class BatchEvent(msgspec.Struct):
+    type: Name = "page_view"
+    url: Optional[Url] = None
+    ref: Optional[Url] = None
+    meta: msgspec.Raw = EMPTY_META
+    # Milliseconds since the event was queued on the client
+    dt: int = 0
+    id: Optional[Id] = None
+
+
+class Batch(Beacon):
+    """Events posted to /api/v1/collect/batch; they share the session context of the envelope."""
+    events: Annotated[List[BatchEvent], msgspec.Meta(max_length=MAX_BATCH_EVENTS)] = []
+
+    def event_beacon(self, event: BatchEvent) -> Beacon:
+        return Beacon(
+            rid=self.rid, sid=self.sid, session_id=self.session_id, type=event.type,
+            url=self.url if event.url is None else event.url,
+            ref=self.ref if event.ref is None else event.ref,
+            res=self.res, lang=self.lang, utm_s=self.utm_s, utm_m=self.utm_m, utm_c=self.utm_c,
+            fbclid=self.fbclid, ttclid=self.ttclid, eid=event.id, meta=event.meta,
+        )
+
+    def beacons(self, now: datetime.datetime):
+        """Yields (beacon, timestamp) per event, backdating each by its queueing delay."""
+        for event in self.events:
+            delay = min(max(event.dt, 0), MAX_EVENT_DELAY_MS)
+            yield self.event_beacon(event), now - datetime.timedelta(milliseconds=delay)
+
+
+def meta_json(meta: msgspec.Raw) -> str:
+    raw = bytes(meta)
+    if not raw.startswith(b"{"):
+        return "{}"
+    if len(raw) > settings.INGEST_MAX_META_BYTES:
+        raise HTTPException(status_code=413, detail="Event meta too large")
+    return raw.decode()
+
+
+_beacon_decoder = msgspec.json.Decoder(Beacon)
+_batch_decoder = msgspec.json.Decoder(Batch)
+
+
+def _decode(decoder: msgspec.json.Decoder, body: bytes):
+    try:
+        return decoder.decode(body)
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid event: {e}")
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed JSON: {e}")
+
+
+def decode_beacon(body: bytes) -> Beacon:
+    return _decode(_beacon_decoder, body)
+
+
+def decode_batch(body: bytes) -> Batch:
+    return _decode(_batch_decoder, body)
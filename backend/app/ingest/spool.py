@@ -0,0 +1,137 @@
+import datetime
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Cannot spool {type(value).__name__}")
+
+
+def _decode(obj):
+    if "$dt" in obj:
+        return datetime.datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+class DiskSpool:
+    """
+    Append-only on-disk queue of rows, split into numbered JSON-lines segments.
+    Rows are written to the newest segment and read back oldest segment first,
+    so replay preserves arrival order.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._segments: Optional[List[int]] = None
+        self._active_bytes = 0
+        self.total_bytes = 0
+        self.spooled_rows = 0
+        self.rejected_rows = 0
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}.jsonl")
+
+    def _load(self):
+        if self._segments is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[:-6]) for name in os.listdir(self.directory)
+            if name.endswith(".jsonl") and name[:-6].isdigit()
+        )
+        self.total_bytes = sum(os.path.getsize(self._path(seq)) for seq in self._segments)
+        self._active_bytes = os.path.getsize(self._path(self._segments[-1])) if self._segments else 0
+
+    def _rotate(self):
+        self._segments.append(self._segments[-1] + 1 if self._segments else 1)
+        self._active_bytes = 0
+
+    def append(self, rows: Sequence[Sequence[Any]]) -> int:
+        """Durably appends rows. Returns how many were written before the size cap."""
+        with self._lock:
+            self._load()
+            lines = []
+            size = 0
+            for row in rows:
+                line = (json.dumps(list(row), default=_encode, separators=(",", ":")) + "\n").encode()
+                if self.total_bytes + size + len(line) > self.max_bytes:
+                    break
+                lines.append(line)
+                size += len(line)
+            self.rejected_rows += len(rows) - len(lines)
+            if not lines:
+                return 0
+
+            if not self._segments or self._active_bytes >= self.segment_bytes:
+                self._rotate()
+            with open(self._path(self._segments[-1]), "ab") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._active_bytes += size
+            self.total_bytes += size
+            self.spooled_rows += len(lines)
+            return len(lines)
+
+    def oldest(self) -> Optional[Tuple[int, List[list]]]:
+        """Returns the oldest segment and its rows, sealing the active segment if it is the only one."""
+        with self._lock:
+            self._load()
+            # The newest segment may not have been written to yet after a rotation
+            while self._segments and not os.path.exists(self._path(self._segments[0])):
+                if len(self._segments) == 1:
+                    return None
+                self._segments.pop(0)
+            if not self._segments:
+                return None
+            seq = self._segments[0]
+            if len(self._segments) == 1:
+                self._rotate()
+            with open(self._path(seq), "rb") as f:
+                data = f.read()
+        rows = []
+        for line in data.splitlines():
+            try:
+                rows.append(json.loads(line, object_hook=_decode))
+            except ValueError:
+                # A torn final line from a crash mid-write; the rest of the segment is intact
+                continue
+        return seq, rows
+
+    def remove(self, seq: int):
+        with self._lock:
+            path = self._path(seq)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if os.path.exists(path):
+                os.remove(path)
+            if seq in self._segments:
+                self._segments.remove(seq)
+            self.total_bytes -= size
+            if not self._segments:
+                self._active_bytes = 0
+
+    def pending(self) -> bool:
+        with self._lock:
+            try:
+                self._load()
+            except OSError:
+                return False
+            return self.total_bytes > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "segments": sum(1 for seq in (self._segments or []) if os.path.exists(self._path(seq))),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "spooled_rows": self.spooled_rows,
+                "rejected_rows": self.rejected_rows,
+            }
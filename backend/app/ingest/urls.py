@@ -0,0 +1,59 @@
+from functools import lru_cache
+from typing import Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from ..config import settings
+
+# Click ids and campaign tags; they identify a visit, not a page
+TRACKING_PARAMS = frozenset({
+    "fbclid", "ttclid", "gclid", "gbraid", "wbraid", "dclid", "msclkid", "yclid",
+    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "ref", "ref_src",
+})
+
+
+def normalize_path(path: str) -> str:
+    """Drops the trailing slash so `/pricing/` and `/pricing` are one page."""
+    if not path:
+        return "/"
+    if not path.startswith("/"):
+        path = "/" + path
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+    return path
+
+
+def _is_tracking(name: str) -> bool:
+    name = name.lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMS
+
+
+@lru_cache(maxsize=settings.URL_CACHE_SIZE)
+def split_url(url: str) -> Tuple[str, str, str]:
+    """
+    Returns (host, path, canonical_path) for a page URL.
+
+    `path` has no query string or fragment. `canonical_path` keeps the query
+    parameters that select content, sorted, with tracking parameters removed.
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return "", "", ""
+
+    path = normalize_path(parts.path)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k))
+    canonical = f"{path}?{urlencode(params)}" if params else path
+    return host, path, canonical
+
+
+@lru_cache(maxsize=settings.URL_CACHE_SIZE)
+def ref_domain(referrer: str) -> str:
+    """Referrer host without `www.`, matching ClickHouse's domainWithoutWWW()."""
+    if not referrer:
+        return ""
+    try:
+        host = (urlsplit(referrer).hostname or "").lower()
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
@@ -0,0 +1,38 @@
+from functools import lru_cache
+from typing import Tuple
+
+from ..config import settings
+
+# Same precedence as the multiIf(...) expressions dashboards used to run per row
+_OS_RULES = (
+    (("Windows",), "Windows"),
+    (("Android",), "Android"),
+    (("iPhone", "iPad"), "iOS"),
+    (("Macintosh",), "macOS"),
+    (("Linux",), "Linux"),
+)
+
+
+@lru_cache(maxsize=settings.UA_CACHE_SIZE)
+def parse_user_agent(user_agent: str) -> Tuple[str, str, str]:
+    """Returns (device, os, browser) for a User-Agent header."""
+    device = "Mobile" if "Mobi" in user_agent else "Desktop"
+
+    os_name = "Other"
+    for needles, name in _OS_RULES:
+        if any(n in user_agent for n in needles):
+            os_name = name
+            break
+
+    if "Edg" in user_agent:
+        browser = "Edge"
+    elif "Chrome" in user_agent:
+        browser = "Chrome"
+    elif "Safari" in user_agent:
+        browser = "Safari"
+    elif "Firefox" in user_agent:
+        browser = "Firefox"
+    else:
+        browser = "Other"
+
+    return device, os_name, browser
@@ -0,0 +1,294 @@
+from .database import get_clickhouse_client
+from .ingest.heatmap import BIN_COLUMNS, BIN_ROW_PX, MOBILE_MAX_WIDTH
+
+# Per-session rollup feeding the `sessions` table, one row per session and day. The source
+# is the first event's: later pages of a session have the site itself as referrer.
+SESSIONS_SELECT = """
+        SELECT
+            resource_id,
+            session_id,
+            toDate(timestamp) as day,
+            min(timestamp) as start_time,
+            max(timestamp) as end_time,
+            count() as events,
+            countIf(event_type = 'page_view') as pageviews,
+            argMinState(url, timestamp) as entry_url,
+            argMaxState(url, timestamp) as exit_url,
+            argMinState(multiIf(utm_source != '', utm_source, ref_domain != '', ref_domain, 'Direct'), timestamp) as source,
+            any(device) as device,
+            max(sample_weight) as sample_weight
+        FROM telemetry
+        WHERE is_bot = 0
+        GROUP BY resource_id, session_id, day
+"""
+
+# First-seen date and attributes per identity, feeding `user_cohorts` (until 0005 leaves bots out)
+USER_COHORTS_SELECT = """
+        SELECT
+            resource_id,
+            session_id as identity,
+            min(toDate(timestamp)) as first_event_date,
+            any(utm_source) as source,
+            any(country) as country,
+            any(device) as device
+        FROM telemetry
+        GROUP BY resource_id, identity
+"""
+
+# Daily click counts per page, viewport class and base grid cell, feeding `heatmap_bins`
+HEATMAP_BINS_SELECT = f"""
+        SELECT
+            resource_id,
+            host,
+            canonical_path,
+            toDate(timestamp) as day,
+            if(viewport_width > 0 AND viewport_width < {MOBILE_MAX_WIDTH}, 'mobile', 'desktop') as viewport,
+            toUInt8(least(floor(x * {BIN_COLUMNS}), {BIN_COLUMNS - 1})) as bx,
+            intDiv(y, {BIN_ROW_PX}) as by,
+            sum(sample_weight) as clicks
+        FROM heatmap_clicks
+        GROUP BY resource_id, host, canonical_path, day, viewport, bx, by
+"""
+
+# Per-page heatmap catalog feeding `heatmap_urls`: clicks and last-seen time per canonical page
+HEATMAP_URLS_SELECT = """
+        SELECT
+            resource_id,
+            host,
+            canonical_path,
+            anyLast(url) as url,
+            sum(sample_weight) as clicks,
+            max(timestamp) as last_seen
+        FROM heatmap_clicks
+        GROUP BY resource_id, host, canonical_path
+"""
+
+def verify_heatmap_copy(client):
+    """Refuses to go on unless every legacy click in telemetry made it into heatmap_clicks."""
+    expected = client.query("""
+        SELECT sum(length(JSONExtractArrayRaw(payload, 'clicks')))
+        FROM telemetry
+        WHERE event_type = 'heatmap_batch' AND is_bot = 0
+    """).first_row[0] or 0
+    copied = client.query("SELECT count() FROM heatmap_clicks").first_row[0] or 0
+    if copied < expected:
+        raise RuntimeError(f"heatmap_clicks holds {copied} of {expected} legacy clicks")
+
+
+# Synchronous mutations: later statements (and migrations) read what the mutation writes
+SYNC_MUTATION = {"mutations_sync": 2}
+
+# Ordered ClickHouse schema changes for installs created from an older init.sql.
+# Each entry runs once; applied ids are recorded in `schema_migrations` after its
+# last statement, so a migration that fails part way is run again from the start
+# and every statement must be safe to repeat (backfills empty their target first).
+# A statement is SQL, (SQL, query settings), or a check called with the client.
+CLICKHOUSE_MIGRATIONS = [
+    ("0001_telemetry_user_agent_columns", [
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS device LowCardinality(String) DEFAULT ''",
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS os LowCardinality(String) DEFAULT ''",
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS browser LowCardinality(String) DEFAULT ''",
+    ]),
+    ("0002_user_cohorts_device", [
+        "DROP VIEW IF EXISTS mv_user_cohorts",
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_cohorts
+        TO user_cohorts
+        AS SELECT
+            resource_id,
+            session_id as identity,
+            min(toDate(timestamp)) as first_event_date,
+            any(utm_source) as source,
+            any(lang) as country,
+            any(device) as device
+        FROM telemetry
+        GROUP BY resource_id, identity
+        """,
+    ]),
+    ("0003_telemetry_geo_columns", [
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS country LowCardinality(String) DEFAULT ''",
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS city LowCardinality(String) DEFAULT ''",
+        "DROP VIEW IF EXISTS mv_user_cohorts",
+        # Rebuild so no cohort keeps the lang code 0002 stored as its country;
+        # events from before GeoIP enrichment have no country
+        "TRUNCATE TABLE user_cohorts",
+        "INSERT INTO user_cohorts " + USER_COHORTS_SELECT,
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_cohorts TO user_cohorts AS " + USER_COHORTS_SELECT,
+    ]),
+    ("0004_telemetry_url_columns", [
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS host LowCardinality(String) DEFAULT ''",
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS path String DEFAULT ''",
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS canonical_path String DEFAULT ''",
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS ref_domain LowCardinality(String) DEFAULT ''",
+        "ALTER TABLE telemetry ADD INDEX IF NOT EXISTS idx_host host TYPE set(1000) GRANULARITY 4",
+        "ALTER TABLE telemetry ADD INDEX IF NOT EXISTS idx_path path TYPE bloom_filter(0.01) GRANULARITY 4",
+        "ALTER TABLE telemetry ADD INDEX IF NOT EXISTS idx_canonical_path canonical_path TYPE bloom_filter(0.01) GRANULARITY 4",
+        "ALTER TABLE telemetry ADD INDEX IF NOT EXISTS idx_ref_domain ref_domain TYPE set(1000) GRANULARITY 4",
+        # Fills older rows in SQL (this also builds the new indexes for their parts);
+        # their canonical_path is the bare path since the query string can't be filtered here
+        (r"""
+        ALTER TABLE telemetry UPDATE
+            host = lower(domain(url)),
+            path = if(path(url) = '', '/', replaceRegexpOne(path(url), '(.)/+$', '\\1')),
+            canonical_path = if(path(url) = '', '/', replaceRegexpOne(path(url), '(.)/+$', '\\1')),
+            ref_domain = lower(domainWithoutWWW(referrer))
+        WHERE host = '' AND url != ''
+        """, SYNC_MUTATION),
+    ]),
+    ("0005_telemetry_bots", [
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS is_bot UInt8 DEFAULT 0",
+        """
+        CREATE TABLE IF NOT EXISTS telemetry_bots AS telemetry
+        ENGINE = MergeTree()
+        ORDER BY (resource_id, timestamp)
+        TTL toDateTime(timestamp) + INTERVAL 30 DAY
+        """,
+        "DROP VIEW IF EXISTS mv_user_cohorts",
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_cohorts
+        TO user_cohorts
+        AS SELECT
+            resource_id,
+            session_id as identity,
+            min(toDate(timestamp)) as first_event_date,
+            any(utm_source) as source,
+            any(country) as country,
+            any(device) as device
+        FROM telemetry
+        WHERE is_bot = 0
+        GROUP BY resource_id, identity
+        """,
+    ]),
+    ("0006_telemetry_sample_weight", [
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS sample_weight Float32 DEFAULT 1",
+        "ALTER TABLE telemetry_bots ADD COLUMN IF NOT EXISTS sample_weight Float32 DEFAULT 1",
+    ]),
+    ("0007_telemetry_event_id", [
+        "ALTER TABLE telemetry ADD COLUMN IF NOT EXISTS event_id String DEFAULT ''",
+        "ALTER TABLE telemetry_bots ADD COLUMN IF NOT EXISTS event_id String DEFAULT ''",
+    ]),
+    ("0008_sessions_rollup", [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            resource_id String,
+            session_id String,
+            day Date,
+            start_time SimpleAggregateFunction(min, DateTime64(3)),
+            end_time SimpleAggregateFunction(max, DateTime64(3)),
+            events SimpleAggregateFunction(sum, UInt64),
+            pageviews SimpleAggregateFunction(sum, UInt64),
+            entry_url AggregateFunction(argMin, String, DateTime64(3)),
+            exit_url AggregateFunction(argMax, String, DateTime64(3)),
+            source AggregateFunction(argMin, String, DateTime64(3)),
+            device SimpleAggregateFunction(any, String),
+            sample_weight SimpleAggregateFunction(max, Float32)
+        ) ENGINE = AggregatingMergeTree()
+        ORDER BY (resource_id, day, session_id)
+        """,
+        # Backfill before the view exists so no rows are counted twice; this runs
+        # at startup, before the ingest buffer starts writing
+        "TRUNCATE TABLE sessions",
+        "INSERT INTO sessions " + SESSIONS_SELECT,
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_sessions TO sessions AS " + SESSIONS_SELECT,
+    ]),
+    ("0009_heatmap_clicks", [
+        """
+        CREATE TABLE IF NOT EXISTS heatmap_clicks (
+            resource_id String,
+            session_id String,
+            host LowCardinality(String),
+            canonical_path String,
+            url String,
+            timestamp DateTime64(3),
+            device LowCardinality(String),
+            viewport_width UInt16,
+            x Float32,
+            y UInt32,
+            t UInt32,
+            sample_weight Float32 DEFAULT 1
+        ) ENGINE = MergeTree()
+        PARTITION BY toYYYYMM(timestamp)
+        ORDER BY (resource_id, host, canonical_path, timestamp)
+        """,
+        "TRUNCATE TABLE heatmap_clicks",
+        # Unpack the JSON click arrays already stored in telemetry (0012 drops them
+        # from it); older SDKs sent no viewport width, so the screen width stands in
+        """
+        INSERT INTO heatmap_clicks
+        SELECT
+            resource_id, session_id, host, canonical_path, url, timestamp, device,
+            toUInt16(least(toUInt32OrZero(splitByChar('x', screen_res)[1]), 65535)) as viewport_width,
+            least(greatest(JSONExtractFloat(click, 'x'), 0), 1) as x,
+            toUInt32(greatest(JSONExtractFloat(click, 'y'), 0)) as y,
+            toUInt32(greatest(JSONExtractFloat(click, 't'), 0)) as t,
+            sample_weight
+        FROM telemetry
+        ARRAY JOIN JSONExtractArrayRaw(payload, 'clicks') as click
+        WHERE event_type = 'heatmap_batch' AND is_bot = 0
+        """,
+        verify_heatmap_copy,
+    ]),
+    ("0010_heatmap_bins", [
+        """
+        CREATE TABLE IF NOT EXISTS heatmap_bins (
+            resource_id String,
+            host LowCardinality(String),
+            canonical_path String,
+            day Date,
+            viewport LowCardinality(String),
+            bx UInt8,
+            by UInt32,
+            clicks Float64
+        ) ENGINE = SummingMergeTree(clicks)
+        ORDER BY (resource_id, host, canonical_path, day, viewport, by, bx)
+        """,
+        "TRUNCATE TABLE heatmap_bins",
+        "INSERT INTO heatmap_bins " + HEATMAP_BINS_SELECT,
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_heatmap_bins TO heatmap_bins AS " + HEATMAP_BINS_SELECT,
+    ]),
+    ("0011_heatmap_urls", [
+        """
+        CREATE TABLE IF NOT EXISTS heatmap_urls (
+            resource_id String,
+            host LowCardinality(String),
+            canonical_path String,
+            url SimpleAggregateFunction(anyLast, String),
+            clicks SimpleAggregateFunction(sum, Float64),
+            last_seen SimpleAggregateFunction(max, DateTime64(3))
+        ) ENGINE = AggregatingMergeTree()
+        ORDER BY (resource_id, host, canonical_path)
+        """,
+        "TRUNCATE TABLE heatmap_urls",
+        "INSERT INTO heatmap_urls " + HEATMAP_URLS_SELECT,
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_heatmap_urls TO heatmap_urls AS " + HEATMAP_URLS_SELECT,
+    ]),
+    # Separate from the copy in 0009 so a failed or retried copy never runs after rows were deleted
+    ("0012_telemetry_drop_heatmap_batches", [
+        verify_heatmap_copy,
+        ("ALTER TABLE telemetry DELETE WHERE event_type = 'heatmap_batch'", SYNC_MUTATION),
+    ]),
+]
+
+
+def migrate_clickhouse():
+    client = get_clickhouse_client()
+    client.command("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            id String,
+            applied_at DateTime DEFAULT now()
+        ) ENGINE = ReplacingMergeTree()
+        ORDER BY id
+    """)
+    applied = {row[0] for row in client.query("SELECT id FROM schema_migrations").result_rows}
+
+    for migration_id, statements in CLICKHOUSE_MIGRATIONS:
+        if migration_id in applied:
+            continue
+        for statement in statements:
+            if callable(statement):
+                statement(client)
+                continue
+            sql, query_settings = statement if isinstance(statement, tuple) else (statement, None)
+            client.command(sql, settings=query_settings)
+        client.insert("schema_migrations", [[migration_id]], column_names=["id"])
+        print(f"✓ Applied ClickHouse migration {migration_id}")
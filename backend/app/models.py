@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -21,6 +21,8 @@ class Resource(Base):
     type = Column(String) # 'Website' or 'Telegram Bot'
     token = Column(String, nullable=True) # For bots
     status = Column(String, default="Active")
+    bot_policy = Column(String, default="flag") # 'flag', 'drop' or 'separate'
+    sample_rate = Column(Float, default=1.0) # Share of sessions stored in telemetry
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class Campaign(Base):
@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, List, Optional
+
+from .redis_pool import redis_client
+
+logger = logging.getLogger("teleboard")
+
+SESSION_TTL = 1800
+HEARTBEAT_TTL = 300
+TRIM_INTERVAL = 60
+MAX_PAGES = 200
+
+RESOURCES_KEY = "ot:online:resources"
+
+
+def online_key(resource_id: Optional[str] = None) -> str:
+    """Sorted set of sessions scored by last-seen time; without a resource, covers all of them."""
+    return f"ot:online:{resource_id}" if resource_id else "ot:online"
+
+
+def pages_key(resource_id: str) -> str:
+    return f"ot:online:{resource_id}:pages"
+
+
+def page_key(resource_id: str, path: str) -> str:
+    return f"ot:online:{resource_id}:page:{path}"
+
+
+# Refreshes the active-session record and the online sorted sets in one round
+# trip, keeping previously seen click IDs when the current hit carries none.
+# A session that moved to another page is taken off the previous page's set.
+touch_session = redis_client.register_script("""
+local fbclid, ttclid, path = ARGV[4], ARGV[5], ARGV[10]
+local prev_path
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    local ok, session = pcall(cjson.decode, existing)
+    if ok and type(session) == 'table' then
+        if fbclid == '' and type(session.fbclid) == 'string' then fbclid = session.fbclid end
+        if ttclid == '' and type(session.ttclid) == 'string' then ttclid = session.ttclid end
+        if type(session.path) == 'string' then prev_path = session.path end
+    end
+end
+local session = cjson.encode({ip = ARGV[1], url = ARGV[2], ts = ARGV[3], fbclid = fbclid, ttclid = ttclid, path = path})
+redis.call('SET', KEYS[1], session, 'EX', ARGV[6])
+
+local now, sid = ARGV[7], ARGV[8]
+redis.call('ZADD', KEYS[2], now, sid)
+redis.call('ZADD', KEYS[3], now, ARGV[9])
+redis.call('ZADD', KEYS[4], now, path)
+redis.call('ZADD', KEYS[5], now, sid)
+redis.call('SADD', KEYS[6], ARGV[12])
+if prev_path and prev_path ~= path then
+    redis.call('ZREM', ARGV[11] .. prev_path, sid)
+end
+return 1
+""")
+
+
+async def touch(resource_id: str, session_id: str, ip: str, url: str, path: str, timestamp: datetime.datetime,
+                fbclid: str = "", ttclid: str = ""):
+    await touch_session(
+        keys=[
+            f"ot:active:{resource_id}:{session_id}",
+            online_key(resource_id),
+            online_key(),
+            pages_key(resource_id),
+            page_key(resource_id, path),
+            RESOURCES_KEY,
+        ],
+        args=[
+            ip, url, str(timestamp), fbclid, ttclid, SESSION_TTL,
+            timestamp.timestamp(), session_id, f"{resource_id}:{session_id}", path, page_key(resource_id, ""), resource_id,
+        ],
+    )
+
+
+async def online_count(resource_id: Optional[str] = None, window: int = SESSION_TTL) -> int:
+    """Sessions seen in the last `window` seconds: one ZCOUNT, however many sessions exist."""
+    return await redis_client.zcount(online_key(resource_id), time.time() - window, "+inf")
+
+
+async def online_pages(resource_id: str, window: int = HEARTBEAT_TTL, limit: int = 20) -> List[Dict]:
+    """Online sessions per page for one resource, busiest first."""
+    since = time.time() - window
+    pages = await redis_client.zrevrangebyscore(pages_key(resource_id), "+inf", since, start=0, num=MAX_PAGES)
+    if not pages:
+        return []
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for page in pages:
+            pipe.zcount(page_key(resource_id, page.decode()), since, "+inf")
+        counts = await pipe.execute()
+    ranked = sorted(zip(pages, counts), key=lambda pc: pc[1], reverse=True)
+    return [{"path": page.decode(), "online": count} for page, count in ranked[:limit] if count > 0]
+
+
+async def trim():
+    """Drops sessions and pages not seen within SESSION_TTL from the online sets."""
+    cutoff = time.time() - SESSION_TTL
+    resources = [r.decode() for r in await redis_client.smembers(RESOURCES_KEY)]
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(online_key(), "-inf", cutoff)
+        for rid in resources:
+            pipe.zremrangebyscore(online_key(rid), "-inf", cutoff)
+            pipe.zrangebyscore(pages_key(rid), "-inf", cutoff)
+            pipe.zrangebyscore(pages_key(rid), cutoff, "+inf")
+        results = await pipe.execute()
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for i, rid in enumerate(resources):
+            stale, live = results[2 + i * 3], results[3 + i * 3]
+            if stale:
+                pipe.delete(*(page_key(rid, p.decode()) for p in stale))
+                pipe.zrem(pages_key(rid), *stale)
+            for page in live:
+                pipe.zremrangebyscore(page_key(rid, page.decode()), "-inf", cutoff)
+            if not stale and not live:
+                pipe.srem(RESOURCES_KEY, rid)
+        await pipe.execute()
+
+
+async def run_trimmer():
+    while True:
+        await asyncio.sleep(TRIM_INTERVAL)
+        try:
+            await trim()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Online presence trim failed: {e}")
@@ -0,0 +1,16 @@
+import redis.asyncio as redis
+from .config import settings
+
+# Shared asyncio Redis client; all routers borrow connections from one pool
+redis_pool = redis.ConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    health_check_interval=30,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+async def close_redis():
+    await redis_client.aclose()
+    await redis_pool.aclose()
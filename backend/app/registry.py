@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+from sqlalchemy import select
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+from .redis_pool import redis_client
+from .schemas import schemas
+
+logger = logging.getLogger("teleboard")
+
+INVALIDATION_CHANNEL = "ot:resources:invalidate"
+MISS_REFRESH_INTERVAL = 5.0
+
+
+class ResourceRegistry:
+    """
+    In-memory snapshot of all resources, indexed by uid and id.
+
+    Reloaded from Postgres when any process publishes an invalidation on Redis,
+    and periodically as a fallback, so hot paths never query Postgres for it.
+    """
+
+    def __init__(self):
+        self._by_uid: Dict[str, schemas.Resource] = {}
+        self._by_id: Dict[int, schemas.Resource] = {}
+        self.loaded = False
+        self._last_refresh = 0.0
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._tasks = []
+
+    async def refresh(self):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            async with AsyncSessionLocal() as db:
+                res = await db.execute(select(models.Resource))
+                resources = [schemas.Resource.model_validate(r) for r in res.scalars().all()]
+            self._by_uid = {r.uid: r for r in resources}
+            self._by_id = {r.id: r for r in resources}
+            self.loaded = True
+            self._last_refresh = time.monotonic()
+
+    def by_uid(self, uid: str) -> Optional[schemas.Resource]:
+        return self._by_uid.get(uid)
+
+    def by_id(self, resource_id: int) -> Optional[schemas.Resource]:
+        return self._by_id.get(resource_id)
+
+    def is_known(self, uid: str) -> bool:
+        # Until the first load succeeds, accept everything rather than drop traffic
+        return not self.loaded or uid in self._by_uid
+
+    async def _refresh_on_miss(self):
+        if time.monotonic() - self._last_refresh >= MISS_REFRESH_INTERVAL:
+            await self.refresh()
+
+    async def resolve_uid(self, uid: str) -> Optional[schemas.Resource]:
+        """Cached lookup that reloads once (rate limited) when the uid is missing."""
+        resource = self._by_uid.get(uid)
+        if resource is None:
+            await self._refresh_on_miss()
+            resource = self._by_uid.get(uid)
+        return resource
+
+    async def resolve_id(self, resource_id: int) -> Optional[schemas.Resource]:
+        resource = self._by_id.get(resource_id)
+        if resource is None:
+            await self._refresh_on_miss()
+            resource = self._by_id.get(resource_id)
+        return resource
+
+    async def invalidate(self):
+        """Reloads this process and tells every other process to reload."""
+        await self.refresh()
+        try:
+            await redis_client.publish(INVALIDATION_CHANNEL, "reload")
+        except Exception as e:
+            logger.error(f"Resource registry publish failed: {e}")
+
+    async def _listen(self):
+        while True:
+            try:
+                async with redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Resource registry listener error: {e}")
+                await asyncio.sleep(5)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(settings.RESOURCE_REGISTRY_REFRESH)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Resource registry refresh failed: {e}")
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Resource registry initial load failed: {e}")
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._poll())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+resource_registry = ResourceRegistry()
@@ -1,22 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks, Request as FastAPIRequest
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import datetime
 import json
-import redis
 import httpx
+import msgspec
 import random
 from ..database import get_clickhouse_client
-from ..config import settings
+from ..ingest import telemetry_buffer, bot_buffer, heatmap_buffer, HEATMAP_EVENT, BIN_COLUMNS, BIN_ROW_PX, VIEWPORTS, bot_classifier, in_sample, WEIGHTED_EVENTS, admission, event_priority, event_dedup, PRIORITY_HIGH, read_body, client_ip, geoip, split_url, Beacon, decode_beacon, decode_batch
+from ..redis_pool import redis_client
+from ..registry import resource_registry
+from .. import presence
 from ..conversion_apis import process_event_actions
 from ..database import get_db
 from ..security import verify_token, get_current_user
 from .. import models
 
 router = APIRouter(tags=["Analytics"])
-redis_client = redis.from_url(settings.REDIS_URL)
+
 
 async def check_demo_mode(db: AsyncSession) -> bool:
     try:
@@ -38,10 +42,13 @@ async def send_to_conversion_api(event_name: str, data: dict, fbclid: str = None
         # Check Redis for stored click IDs if not provided
         session_id = data.get("sid", data.get("session_id", "unknown"))
         resource_id = data.get("rid", "")
+        resource = resource_registry.by_uid(resource_id) if resource_id else None
+        if not resource:
+            return
 
         if resource_id and session_id and not (fbclid or ttclid):
             redis_key = f"ot:active:{resource_id}:{session_id}"
-            session_data = redis_client.get(redis_key)
+            session_data = await redis_client.get(redis_key)
             if session_data:
                 try:
                     session_info = json.loads(session_data)
@@ -56,17 +63,7 @@ async def send_to_conversion_api(event_name: str, data: dict, fbclid: str = None
         from ..database import engine
         from sqlalchemy.ext.asyncio import AsyncSession
         async with AsyncSession(engine) as db:
-            # Resolve UID to ID if necessary
-            actual_resource_id = None
-            if resource_id:
-                res_obj = await db.execute(select(models.Resource).where(models.Resource.uid == resource_id))
-                resource = res_obj.scalars().first()
-                if resource:
-                    actual_resource_id = resource.id
-
-            if not actual_resource_id:
-                return
-
+            actual_resource_id = resource.id
             result = await db.execute(
                 select(models.EventAction)
                 .join(models.Event, models.Event.id == models.EventAction.event_id)
@@ -107,50 +104,88 @@ async def send_to_conversion_api(event_name: str, data: dict, fbclid: str = None
     except Exception as e:
         await log_system("ERROR", "CAPI", str(e))
 
+def session_kpis_sql(session_filters: List[str], having: str = "") -> str:
+    """
+    Query returning one (visitors, bounces, avg_duration) row from the pre-aggregated `sessions` table.
+    Rows are per session and day, so they are merged per session first; weights undo sampling.
+    """
+    return f"""
+        SELECT
+            toUInt64(round(sum(w))),
+            toUInt64(round(sumIf(w, events = 1))),
+            ifNotFinite(avgIf(duration, duration > 0), 0)
+        FROM (
+            SELECT session_id, max(sample_weight) as w, sum(events) as events,
+                   dateDiff('second', min(start_time), max(end_time)) as duration
+            FROM sessions
+            WHERE {" AND ".join(session_filters)}
+            GROUP BY session_id
+            {having}
+        )
+    """
+
+def session_kpis(client, session_filters: List[str], params: dict, having: str = ""):
+    """Returns (visitors, bounces, avg_duration) from the sessions rollup."""
+    row = client.query(session_kpis_sql(session_filters, having), parameters=params).first_row
+    if not row:
+        return 0, 0, 0
+    return row[0] or 0, row[1] or 0, row[2] or 0
+
 @router.get("/api/dashboard/stats")
 async def get_dashboard_stats(resource_id: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
     try:
         client = get_clickhouse_client()
         params = {}
-        filters = ["1=1"]
+        filters = ["is_bot = 0"]
+        session_filters = ["1=1"]
         if resource_id and resource_id not in ('null', 'undefined', ''):
             filters.append("resource_id = {rid:String}")
+            session_filters.append("resource_id = {rid:String}")
             params['rid'] = resource_id
         
         # Date filtering
         date_filter = "timestamp >= now() - INTERVAL 24 HOUR"
+        session_filters.append("day >= toDate(now() - INTERVAL 24 HOUR)")
+        session_having = "HAVING max(end_time) >= now() - INTERVAL 24 HOUR"
         if start and end:
             date_filter = "toDate(timestamp) >= {start:String} AND toDate(timestamp) <= {end:String}"
+            session_filters[-1] = "day >= {start:String} AND day <= {end:String}"
+            session_having = ""
             params['start'] = start
             params['end'] = end
         
         where_clause = "WHERE " + " AND ".join(filters)
         where_with_date = f"{where_clause} AND {date_filter}"
 
-        stats_query = f"SELECT uniqExact(session_id) as visitors, count(*) as views FROM telemetry {where_with_date}"
-        stats_res = client.query(stats_query, parameters=params).first_row
-        visitors, views = stats_res if stats_res else (0, 0)
-        
-        # Bounce Rate approximation
-        bounce_query = f"SELECT count(*) FROM (SELECT session_id, count(*) as c FROM telemetry {where_with_date} GROUP BY session_id HAVING c = 1)"
-        bounce_res = client.query(bounce_query, parameters=params).first_row
-        bounce_count = bounce_res[0] if bounce_res else 0
-        bounce_rate = (bounce_count / visitors * 100) if visitors > 0 else 0
-
         # Chart Data (dynamic granularity based on range)
         range_days = 1
         if start and end:
             s_dt = datetime.datetime.strptime(start, '%Y-%m-%d')
             e_dt = datetime.datetime.strptime(end, '%Y-%m-%d')
             range_days = (e_dt - s_dt).days + 1
+        bucket = "toStartOfHour(timestamp)" if range_days <= 2 else "toDate(timestamp)"
+
+        # One pass over telemetry grouped by (chart bucket, device) gives views, the
+        # chart and the audience split; session KPIs ride along from the sessions rollup
+        stats_query = f"""
+            WITH ({session_kpis_sql(session_filters, session_having)}) AS kpis
+            SELECT groupArray((t, dev, c)), kpis.1, kpis.2, kpis.3
+            FROM (
+                SELECT {bucket} as t, device as dev, {WEIGHTED_EVENTS} as c
+                FROM telemetry {where_with_date}
+                GROUP BY t, dev
+            )
+        """
+        buckets, visitors, bounce_count, dur_val = client.query(stats_query, parameters=params).first_row
 
-        if range_days <= 2:
-            chart_query = f"SELECT toStartOfHour(timestamp) as t, count(*) FROM telemetry {where_with_date} GROUP BY t ORDER BY t"
-            # Return last 24 points or similar for the sparkline
-        else:
-            chart_query = f"SELECT toDate(timestamp) as t, count(*) FROM telemetry {where_with_date} GROUP BY t ORDER BY t"
+        views = sum(c for _, _, c in buckets)
+        bounce_rate = (bounce_count / visitors * 100) if visitors > 0 else 0
 
-        chart_res = client.query(chart_query, parameters=params).result_rows
+        chart_counts, device_counts = {}, {}
+        for t, dev, c in buckets:
+            chart_counts[t] = chart_counts.get(t, 0) + c
+            device_counts[dev] = device_counts.get(dev, 0) + c
+        chart_res = sorted(chart_counts.items())
         
         # Simple normalization for the mini-chart
         raw_vals = [row[1] for row in chart_res] if chart_res else [0]
@@ -169,17 +204,14 @@ async def get_dashboard_stats(resource_id: Optional[str] = None, start: Optional
             chart_data = [int((c / max_v) * 100) for c in sorted_counts]
 
         # Real-time online count (stays independent of global date filter)
-        r_pattern = resource_id if resource_id and resource_id != 'undefined' and resource_id != '' else '*'
-        online_count = len(redis_client.keys(f"ot:active:{r_pattern}:*"))
+        online_rid = resource_id if resource_id and resource_id not in ('null', 'undefined', '') else None
+        online_count = await presence.online_count(online_rid, presence.SESSION_TTL)
 
-        session_dur_query = f"SELECT avg(dur) FROM (SELECT session_id, dateDiff('second', min(timestamp), max(timestamp)) as dur FROM telemetry {where_with_date} GROUP BY session_id) WHERE dur > 0"
-        dur_raw = client.query(session_dur_query, parameters=params).first_row
-        dur_val = int(dur_raw[0]) if dur_raw and dur_raw[0] else 0
+        dur_val = int(dur_val)
         session_str = f"{dur_val // 60}m {dur_val % 60}s"
 
         # Audience Breakdown
-        audience_query = f"SELECT multiIf(user_agent LIKE '%Mobi%', 'Mobile', 'Desktop') as dev, count(*) as c FROM telemetry {where_with_date} GROUP BY dev ORDER BY c DESC"
-        audience_res = client.query(audience_query, parameters=params).result_rows
+        audience_res = sorted(device_counts.items(), key=lambda r: r[1], reverse=True)
         total = sum(r[1] for r in audience_res) if audience_res else 0
         audience = {r[0]: int(r[1]/total*100) if total > 0 else 0 for r in audience_res}
 
@@ -192,43 +224,145 @@ async def get_dashboard_stats(resource_id: Optional[str] = None, start: Optional
     except Exception as e:
         print(f"Stats Error: {e}")
         return {"visitors": 0, "views": 0, "session": "-", "bounce": "-", "chart_data": [], "retention": {"d7": "-", "d30": "-", "new_vs_returning": {"new": 0, "returning": 0}}}
-    except Exception as e:
-        print(f"Stats Error: {e}")
-        return {"visitors": 0, "views": 0, "session": "-", "bounce": "-", "chart_data": [], "retention": {"d7": "-", "d30": "-", "new_vs_returning": {"new": 0, "returning": 0}}}
+
+async def refresh_session(beacon: Beacon, ip: str, timestamp: datetime.datetime):
+    session_id = beacon.session
+    if beacon.rid and session_id:
+        await presence.touch(
+            beacon.rid, session_id, ip, beacon.url, split_url(beacon.url)[1] or "/", timestamp,
+            beacon.fbclid or "", beacon.ttclid or "",
+        )
+
+def ingest_target(rid: str, user_agent: str, ip: str, session: str, events: int = 1):
+    """
+    Classifies a request and returns (is_bot, buffer, sample_weight) following the
+    resource's bot_policy and sample_rate. The buffer is None when the rows are not
+    stored: bot traffic the resource drops, or a session outside the sample.
+    """
+    resource = resource_registry.by_uid(rid)
+    is_bot = bot_classifier.classify(user_agent, ip, f"{rid}:{session}", events)
+    policy = resource.bot_policy if resource else "flag"
+    if is_bot and policy == "drop":
+        return True, None, 1.0
+
+    rate = resource.sample_rate if resource else 1.0
+    if not in_sample(session, rate):
+        return is_bot, None, 1.0
+    return is_bot, bot_buffer if is_bot and policy == "separate" else telemetry_buffer, 1.0 / rate
+
+def enqueue(beacon: Beacon, buffer, user_agent: str, ip: str, timestamp: datetime.datetime,
+            is_bot: bool, weight: float) -> bool:
+    """Queues an event: heatmap clicks go to their own table (bots' are dropped), the rest to `buffer`."""
+    if buffer is None:
+        return True
+    if beacon.type == HEATMAP_EVENT:
+        return is_bot or all(heatmap_buffer.add(row) for row in beacon.heatmap_rows(user_agent, timestamp, weight))
+    return buffer.add(beacon.row(user_agent, ip, timestamp, is_bot, weight))
+
+def rejected(priority: int) -> JSONResponse:
+    """Over-limit high priority events get a 429 to retry later; shed low priority ones are just acknowledged."""
+    if priority == PRIORITY_HIGH:
+        return JSONResponse(status_code=429, content={"status": "error", "message": "Rate limited"}, headers={"Retry-After": "1"})
+    return JSONResponse(status_code=202, content={"status": "shed"})
+
+def conversion_data(beacon: Beacon, user_agent: str, ip: str) -> dict:
+    return {"rid": beacon.rid, "sid": beacon.session, "url": beacon.url, "ip": ip, "user_agent": user_agent}
 
 @router.post("/api/v1/collect")
 async def collect_telemetry(request: Request, background_tasks: BackgroundTasks):
     try:
-        data = await request.json()
-        client = get_clickhouse_client()
-        session_id = data.get("sid", data.get("session_id", "unknown"))
-        fbclid, ttclid = data.get("fbclid") or "", data.get("ttclid") or ""
-        event_type = data.get("type", "page_view")
-        
-        payload = {
-            "resource_id": str(data.get("rid", "")), "event_type": event_type, "url": data.get("url", ""), "referrer": data.get("ref", ""),
-            "user_agent": request.headers.get("user-agent", ""), "ip": request.client.host, "screen_res": data.get("res", ""), "lang": data.get("lang", ""),
-            "utm_source": data.get("utm_s") or "", "utm_medium": data.get("utm_m") or "", "utm_campaign": data.get("utm_c") or "",
-            "fbclid": fbclid, "ttclid": ttclid, "session_id": session_id, "payload": json.dumps(data.get("meta") or {}),
-        }
-        
-        if payload["resource_id"] and session_id:
-            redis_key = f"ot:active:{payload['resource_id']}:{session_id}"
-            heartbeat_key = f"ot:heartbeat:{payload['resource_id']}:{session_id}"
-            session_data = {"ip": payload["ip"], "url": payload["url"], "ts": str(datetime.datetime.now()), "fbclid": fbclid, "ttclid": ttclid}
-            existing_data = redis_client.get(redis_key)
-            if existing_data:
-                try:
-                    existing_session = json.loads(existing_data)
-                    if not session_data["fbclid"] and existing_session.get("fbclid"): session_data["fbclid"] = existing_session["fbclid"]
-                    if not session_data["ttclid"] and existing_session.get("ttclid"): session_data["ttclid"] = existing_session["ttclid"]
-                except: pass
-            redis_client.setex(redis_key, 1800, json.dumps(session_data))
-            redis_client.setex(heartbeat_key, 300, "1") # 5 min heartbeat
-
-        client.insert("telemetry", [list(payload.values())], column_names=list(payload.keys()))
-        background_tasks.add_task(send_to_conversion_api, event_type, data, fbclid, ttclid)
+        ip = client_ip(request)
+        if not admission.admit_ip(ip):
+            return rejected(PRIORITY_HIGH)
+        beacon = decode_beacon(await read_body(request))
+        if not resource_registry.is_known(beacon.rid):
+            raise HTTPException(status_code=404, detail="Unknown resource")
+        priority = event_priority(beacon.type)
+        if not admission.admit(beacon.rid, priority):
+            return rejected(priority)
+        if event_dedup.seen(beacon.rid, beacon.eid):
+            return {"status": "duplicate"}
+        user_agent, now = request.headers.get("user-agent", ""), datetime.datetime.now()
+        is_bot, buffer, weight = ingest_target(beacon.rid, user_agent, ip, beacon.session)
+        if not is_bot:
+            await refresh_session(beacon, ip, now)
+
+        # Unsampled sessions still count as online and still reach the conversion APIs
+        if not enqueue(beacon, buffer, user_agent, ip, now, is_bot, weight):
+            return {"status": "error", "message": "Ingest queue is full"}
+        # Only now, so a retry of a refused event isn't taken for a duplicate
+        event_dedup.record(beacon.rid, beacon.eid)
+        if not is_bot:
+            background_tasks.add_task(send_to_conversion_api, beacon.type, conversion_data(beacon, user_agent, ip), beacon.fbclid or "", beacon.ttclid or "")
         return {"status": "success"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await log_system("ERROR", "Telemetry", str(e))
+        return {"status": "error", "message": str(e)}
+
+@router.post("/api/v1/collect/batch")
+async def collect_telemetry_batch(request: Request, background_tasks: BackgroundTasks):
+    """
+    Accepts queued SDK events that share one session context:
+    {"rid", "sid", "ref", ..., "events": [{"type", "url", "meta", "dt"}]}.
+    `dt` is how many milliseconds ago the event was queued on the client.
+    """
+    try:
+        ip = client_ip(request)
+        if not admission.admit_ip(ip):
+            return rejected(PRIORITY_HIGH)
+        batch = decode_batch(await read_body(request))
+        if not batch.events:
+            return {"status": "error", "message": "No events"}
+        if not resource_registry.is_known(batch.rid):
+            raise HTTPException(status_code=404, detail="Unknown resource")
+
+        priorities = [event_priority(e.type) for e in batch.events]
+        admitted = []
+        for event, priority in zip(batch.events, priorities):
+            if admission.admit(batch.rid, priority):
+                admitted.append(event)
+            elif priority == PRIORITY_HIGH:
+                # A refused page view or conversion fails the batch before anything is
+                # stored, so it can be resent whole; only lower priority events are shed
+                return rejected(PRIORITY_HIGH)
+        if not admitted:
+            return rejected(min(priorities))
+        fresh, ids = [], set()
+        for event in admitted:
+            if (event.id and event.id in ids) or event_dedup.seen(batch.rid, event.id):
+                continue
+            ids.add(event.id)
+            fresh.append(event)
+        shed, batch.events = len(batch.events) - len(admitted), fresh
+        if not batch.events:
+            return {"status": "duplicate"}
+
+        user_agent, now = request.headers.get("user-agent", ""), datetime.datetime.now()
+        is_bot, buffer, weight = ingest_target(batch.rid, user_agent, ip, batch.session, len(batch.events))
+        if is_bot and buffer is None:
+            for event in batch.events:
+                event_dedup.record(batch.rid, event.id)
+            return {"status": "success", "accepted": len(batch.events), "shed": shed}
+
+        accepted, beacon = 0, None
+        for beacon, timestamp in batch.beacons(now):
+            if not enqueue(beacon, buffer, user_agent, ip, timestamp, is_bot, weight):
+                break
+            # Events left after a full queue stay unrecorded so the client can resend them
+            event_dedup.record(batch.rid, beacon.eid)
+            accepted += 1
+            if not is_bot:
+                background_tasks.add_task(send_to_conversion_api, beacon.type, conversion_data(beacon, user_agent, ip), beacon.fbclid or "", beacon.ttclid or "")
+
+        if not is_bot:
+            await refresh_session(beacon, ip, now)
+        if accepted == 0:
+            return {"status": "error", "message": "Ingest queue is full"}
+        return {"status": "success", "accepted": accepted, "shed": shed}
+    except HTTPException:
+        raise
     except Exception as e:
         await log_system("ERROR", "Telemetry", str(e))
         return {"status": "error", "message": str(e)}
@@ -236,20 +370,17 @@ async def collect_telemetry(request: Request, background_tasks: BackgroundTasks)
 @router.get("/api/analytics/live")
 async def get_live_analytics(resource_id: Optional[str] = None, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
     try:
-        r_pattern = resource_id if resource_id and resource_id != 'undefined' else '*'
-        pattern = f"ot:heartbeat:{r_pattern}:*"
-        keys = redis_client.keys(pattern)
-        count = len(keys)
+        online_rid = resource_id if resource_id and resource_id != 'undefined' else None
+        count = await presence.online_count(online_rid, presence.HEARTBEAT_TTL)
         
-        # If no heartbeats, check active sessions (fallback)
+        # If nobody was seen in the heartbeat window, fall back to active sessions
         if count == 0:
-            pattern_full = f"ot:active:{r_pattern}:*"
-            keys_full = redis_client.keys(pattern_full)
-            count = len(keys_full)
+            count = await presence.online_count(online_rid, presence.SESSION_TTL)
+        pages = await presence.online_pages(online_rid) if online_rid else []
 
         client = get_clickhouse_client()
         params = {}
-        filters = ["1=1"]
+        filters = ["is_bot = 0"]
         if resource_id and resource_id != 'undefined':
              filters.append("resource_id = {rid:String}")
              params['rid'] = resource_id
@@ -259,8 +390,20 @@ async def get_live_analytics(resource_id: Optional[str] = None, db: AsyncSession
         events_res = client.query(events_query, parameters=params).result_rows
         recent_events = [{"type": r[0], "url": r[1], "ip": r[2], "ts": r[3], "session_id": r[4]} for r in events_res] if events_res else []
 
-        locations = [{"lat": 50.45, "lng": 30.52, "city": "User", "count": count}] if count > 0 else []
-        return {"online": count, "locations": locations, "events": recent_events}
+        geo_query = f"""
+            SELECT country, city, any(ip), uniqExact(session_id) as visitors
+            FROM telemetry
+            {where_clause} AND timestamp >= now() - INTERVAL 5 MINUTE AND country != ''
+            GROUP BY country, city
+            ORDER BY visitors DESC
+            LIMIT 50
+        """
+        locations = []
+        for country, city, ip, visitors in client.query(geo_query, parameters=params).result_rows:
+            point = geoip.location(ip)
+            if point:
+                locations.append({"lat": point[0], "lng": point[1], "country": country, "city": city or country, "count": visitors})
+        return {"online": count, "pages": pages, "locations": locations, "events": recent_events}
     except Exception as e:
         return {"online": 0, "locations": [], "error": str(e)}
 
@@ -276,41 +419,39 @@ async def get_logs(current_user = Depends(get_current_user)):
 async def explore_analytics(resource_id: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
     try:
         client = get_clickhouse_client()
-        params, conditions = {}, []
+        params, conditions, session_filters = {}, ["is_bot = 0"], ["1=1"]
         if resource_id and resource_id != 'undefined':
              conditions.append("resource_id = {rid:String}")
+             session_filters.append("resource_id = {rid:String}")
              params['rid'] = resource_id
-        if start: conditions.append("toDate(timestamp) >= {start:String}"); params['start'] = start
-        if end: conditions.append("toDate(timestamp) <= {end:String}"); params['end'] = end
+        if start:
+            conditions.append("toDate(timestamp) >= {start:String}"); session_filters.append("day >= {start:String}"); params['start'] = start
+        if end:
+            conditions.append("toDate(timestamp) <= {end:String}"); session_filters.append("day <= {end:String}"); params['end'] = end
         where_clause = "WHERE " + " AND ".join(conditions) if conditions else "WHERE 1=1"
         
-        metrics_query = f"SELECT uniqExact(session_id), count(*) FROM telemetry {where_clause}"
-        metrics_res = client.query(metrics_query, parameters=params).first_row
-        visitors, views = metrics_res if metrics_res else (0, 0)
-        
-        bounce_query = f"SELECT count(*) FROM (SELECT session_id, count(*) as c FROM telemetry {where_clause} GROUP BY session_id HAVING c = 1)"
-        bounces_res = client.query(bounce_query, parameters=params).first_row
-        bounces = bounces_res[0] if bounces_res else 0
+        views_res = client.query(f"SELECT {WEIGHTED_EVENTS} FROM telemetry {where_clause}", parameters=params).first_row
+        views = views_res[0] if views_res else 0
+        visitors, bounces, _ = session_kpis(client, session_filters, params)
         bounce_rate = (bounces / visitors * 100) if visitors > 0 else 0
 
         # OS Breakdown
-        os_query = f"SELECT multiIf(user_agent LIKE '%Windows%', 'Windows', user_agent LIKE '%Android%', 'Android', user_agent LIKE '%iPhone%' OR user_agent LIKE '%iPad%', 'iOS', user_agent LIKE '%Macintosh%', 'macOS', user_agent LIKE '%Linux%', 'Linux', 'Other') as os, count(*) as c FROM telemetry {where_clause} GROUP BY os ORDER BY c DESC"
+        os_query = f"SELECT os, {WEIGHTED_EVENTS} as c FROM telemetry {where_clause} GROUP BY os ORDER BY c DESC"
         os_res = client.query(os_query, parameters=params).result_rows
         os_data = [{"name": r[0], "val": r[1]} for r in os_res]
 
         # Browser Breakdown
-        browser_query = f"SELECT multiIf(user_agent LIKE '%Edg%', 'Edge', user_agent LIKE '%Chrome%', 'Chrome', user_agent LIKE '%Safari%' AND user_agent NOT LIKE '%Chrome%', 'Safari', user_agent LIKE '%Firefox%', 'Firefox', 'Other') as browser, count(*) as c FROM telemetry {where_clause} GROUP BY browser ORDER BY c DESC"
+        browser_query = f"SELECT browser, {WEIGHTED_EVENTS} as c FROM telemetry {where_clause} GROUP BY browser ORDER BY c DESC"
         browser_res = client.query(browser_query, parameters=params).result_rows
         browser_data = [{"name": r[0], "val": r[1]} for r in browser_res]
 
         # Device Breakdown
-        device_query = f"SELECT multiIf(user_agent LIKE '%Mobi%', 'Mobile', 'Desktop') as device, count(*) as c FROM telemetry {where_clause} GROUP BY device ORDER BY c DESC"
+        device_query = f"SELECT device, {WEIGHTED_EVENTS} as c FROM telemetry {where_clause} GROUP BY device ORDER BY c DESC"
         device_res = client.query(device_query, parameters=params).result_rows
         device_data = [{"name": r[0], "val": r[1]} for r in device_res]
 
         # Detailed Referrers
-        # Using domain() and if parsing fails, returning full referrer or 'Other'
-        ref_query = f"SELECT if(referrer='', 'Direct', domain(referrer)) as ref, count(*) as c FROM telemetry {where_clause} GROUP BY ref ORDER BY c DESC LIMIT 10"
+        ref_query = f"SELECT if(ref_domain = '', 'Direct', ref_domain) as ref, {WEIGHTED_EVENTS} as c FROM telemetry {where_clause} GROUP BY ref ORDER BY c DESC LIMIT 10"
         ref_res = client.query(ref_query, parameters=params).result_rows
         referrers = [{"name": r[0], "val": r[1]} for r in ref_res]
 
@@ -331,34 +472,83 @@ async def explore_analytics(resource_id: Optional[str] = None, start: Optional[s
         print(f"Explore Error: {e}")
         return {"metrics": {"visitors": 0, "views": 0, "bounce_rate": 0}, "sources": [], "error": str(e)}
 
+HEATMAP_URL_ORDER = {"clicks": "total_clicks DESC", "recent": "seen DESC"}
+
 @router.get("/api/analytics/heatmap/urls")
-async def get_heatmap_urls(resource_id: str):
+async def get_heatmap_urls(resource_id: str, sort: str = "clicks", limit: int = 100, offset: int = 0):
+    """
+    Pages with heatmap clicks, from the heatmap_urls catalog, busiest or most recent
+    first. `host` and `canonical_path` are the page's key for /heatmap/bins; `url` is
+    a sample address to display, which for migrated clicks may not map back to the key.
+    """
     try:
         client = get_clickhouse_client()
-        query = "SELECT DISTINCT url FROM telemetry WHERE event_type = 'heatmap_batch' AND resource_id = {rid:String}"
-        res = client.query(query, parameters={"rid": resource_id}).result_rows
-        return [r[0] for r in res]
+        # Catalog rows are merged in the background, so fold any unmerged parts here
+        query = f"""
+            SELECT host, canonical_path, anyLast(url), sum(clicks) as total_clicks, max(last_seen) as seen
+            FROM heatmap_urls
+            WHERE resource_id = {{rid:String}}
+            GROUP BY host, canonical_path
+            ORDER BY {HEATMAP_URL_ORDER.get(sort, HEATMAP_URL_ORDER["clicks"])}, host, canonical_path
+            LIMIT {{limit:UInt32}} OFFSET {{offset:UInt32}}
+        """
+        params = {"rid": resource_id, "limit": min(max(limit, 1), 1000), "offset": max(offset, 0)}
+        res = client.query(query, parameters=params).result_rows
+        return [
+            {"host": host, "canonical_path": page, "url": url, "clicks": round(clicks), "last_seen": seen.isoformat()}
+            for host, page, url, clicks, seen in res
+        ]
     except: return []
 
-@router.get("/api/analytics/heatmap/data")
-async def get_heatmap_data(resource_id: str, url: str):
+MAX_HEATMAP_ROWS = 2000
+
+@router.get("/api/analytics/heatmap/bins")
+async def get_heatmap_bins(resource_id: str, host: str, canonical_path: str, cols: int = 100, row_px: int = 20,
+                           start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Click density for a page, keyed by `host` and `canonical_path` as listed in the
+    /heatmap/urls catalog, as a `rows x cols` matrix per viewport class, where
+    a column is 1/cols of the viewport width and a row is `row_px` page pixels.
+    Read from the daily heatmap_bins rollup, so the cost follows grid size and
+    days, not the number of clicks.
+    """
+    cols = min(max(cols, 1), BIN_COLUMNS)
+    row_bins = max(row_px // BIN_ROW_PX, 1)
+    empty = {"cols": cols, "row_px": row_bins * BIN_ROW_PX, "viewports": {}}
     try:
         client = get_clickhouse_client()
-        query = "SELECT payload, screen_res FROM telemetry WHERE event_type = 'heatmap_batch' AND resource_id = {rid:String} AND url = {url:String}"
-        res = client.query(query, parameters={"rid": resource_id, "url": url}).result_rows
-        
-        all_clicks = []
-        for row in res:
-            try:
-                data = json.loads(row[0])
-                res_val = row[1]
-                if "clicks" in data:
-                    for c in data["clicks"]:
-                        c["res"] = res_val
-                        all_clicks.append(c)
-            except: continue
-        return all_clicks
-    except: return []
+        params = {"rid": resource_id, "host": host, "page": canonical_path,
+                  "cols": cols, "row_bins": row_bins, "max_by": MAX_HEATMAP_ROWS * row_bins}
+        filters = ["resource_id = {rid:String}", "host = {host:String}", "canonical_path = {page:String}",
+                   "by < {max_by:UInt32}"]
+        if start and end:
+            filters.append("day >= {start:String} AND day <= {end:String}")
+            params.update(start=start, end=end)
+        query = f"""
+            SELECT viewport, intDiv(bx * {{cols:UInt16}}, {BIN_COLUMNS}) as col, intDiv(by, {{row_bins:UInt32}}) as row, sum(clicks)
+            FROM heatmap_bins
+            WHERE {" AND ".join(filters)}
+            GROUP BY viewport, col, row
+        """
+        cells = {v: [] for v in VIEWPORTS}
+        for viewport, col, row, value in client.query(query, parameters=params).result_rows:
+            cells.setdefault(viewport, []).append((row, col, value))
+
+        viewports = {}
+        for viewport, points in cells.items():
+            matrix = [[0.0] * cols for _ in range(max((r for r, _, _ in points), default=-1) + 1)]
+            for row, col, value in points:
+                matrix[row][col] = round(value, 2)
+            viewports[viewport] = {
+                "rows": len(matrix),
+                "total": round(sum(v for _, _, v in points)),
+                "max": round(max((v for _, _, v in points), default=0), 2),
+                "matrix": matrix,
+            }
+        return {**empty, "viewports": viewports}
+    except Exception as e:
+        print(f"Heatmap bins error: {e}")
+        return empty
 
 class CustomEventReq(BaseModel):
     name: str
@@ -371,27 +561,22 @@ class CustomEventReq(BaseModel):
 
 @router.post("/api/v1/event")
 async def track_custom_event(req: CustomEventReq, request: FastAPIRequest):
+    if not resource_registry.is_known(req.project_id):
+        raise HTTPException(status_code=404, detail="Unknown resource")
     try:
-        client = get_clickhouse_client()
-        payload = {
-            "resource_id": req.project_id,
-            "event_type": req.name,
-            "url": "server-side",
-            "referrer": "",
-            "user_agent": request.headers.get("user-agent", "server-sdk"),
-            "ip": request.client.host,
-            "screen_res": "",
-            "lang": "",
-            "utm_source": req.utm_source or "",
-            "utm_medium": req.utm_medium or "",
-            "utm_campaign": req.utm_campaign or "",
-            "fbclid": "",
-            "ttclid": "",
-            "session_id": req.session_id or f"ss_{random.randint(1000,9999)}",
-            "payload": json.dumps(req.payload),
-            "timestamp": datetime.datetime.now()
-        }
-        client.insert("telemetry", [list(payload.values())], column_names=list(payload.keys()))
+        beacon = Beacon(
+            rid=req.project_id,
+            sid=req.session_id or f"ss_{random.randint(1000,9999)}",
+            type=req.name,
+            url="server-side",
+            utm_s=req.utm_source,
+            utm_m=req.utm_medium,
+            utm_c=req.utm_campaign,
+            meta=msgspec.Raw(json.dumps(req.payload or {}).encode()),
+        )
+        row = beacon.row(request.headers.get("user-agent", "server-sdk"), client_ip(request), datetime.datetime.now())
+        if not telemetry_buffer.add(row):
+            return {"status": "error", "message": "Ingest queue is full"}
         return {"status": "success"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
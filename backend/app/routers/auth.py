@@ -10,11 +10,10 @@ import secrets
 import string
 from datetime import datetime, timedelta
 import logging
-import redis
 from ..config import settings
+from ..redis_pool import redis_client
 
 logger = logging.getLogger(__name__)
-redis_client = redis.from_url(settings.REDIS_URL)
 
 router = APIRouter(tags=["Auth"])
 
@@ -24,7 +23,7 @@ async def login(creds: schemas.LoginRequest, db: AsyncSession = Depends(get_db))
     block_key = f"login_blocked:{creds.email.lower()}"
 
     # Check if blocked
-    if redis_client.get(block_key):
+    if await redis_client.get(block_key):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS, 
             detail="Too many failed attempts. Account blocked for 10 minutes."
@@ -35,13 +34,16 @@ async def login(creds: schemas.LoginRequest, db: AsyncSession = Depends(get_db))
     
     if not user or not verify_password(creds.password, user.hashed_password):
         # Increment failures
-        fails = redis_client.incr(email_key)
-        if fails == 1:
-            redis_client.expire(email_key, 600) # Reset fail counter after 10 mins of no activity
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(email_key)
+            pipe.expire(email_key, 600, nx=True) # Reset fail counter after 10 mins of no activity
+            fails, _ = await pipe.execute()
         
         if fails >= 5:
-            redis_client.setex(block_key, 600, "1") # Block for 10 minutes
-            redis_client.delete(email_key)
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.setex(block_key, 600, "1") # Block for 10 minutes
+                pipe.delete(email_key)
+                await pipe.execute()
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS, 
                 detail="Too many failed attempts. Account blocked for 10 minutes."
@@ -50,8 +52,7 @@ async def login(creds: schemas.LoginRequest, db: AsyncSession = Depends(get_db))
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Success: Clear failures
-    redis_client.delete(email_key)
-    redis_client.delete(block_key)
+    await redis_client.delete(email_key, block_key)
     
     access_token = create_access_token(data={"sub": str(user.id)})
         
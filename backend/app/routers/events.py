@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
@@ -6,9 +6,14 @@ from .. import models
 from ..schemas import schemas
 from ..database import get_db
 from ..security import check_admin_auth, requires_admin, get_current_user
+from ..registry import resource_registry
+from ..sdk_cache import config_versions, rules_cache
 
 router = APIRouter(tags=["Events"])
 
+# Bump when the public rules document changes shape
+RULES_FORMAT = "1"
+
 @router.get("/api/events")
 async def get_events(resource_id: Optional[int] = None, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
     from ..database import get_clickhouse_client
@@ -48,6 +53,7 @@ async def create_event(event: schemas.EventCreate, db: AsyncSession = Depends(ge
     db.add(db_event)
     await db.commit()
     await db.refresh(db_event)
+    await config_versions.bump(db_event.resource_id)
     return db_event
 
 @router.delete("/api/events/{id}")
@@ -63,6 +69,7 @@ async def delete_event(id: int, req: schemas.DeleteRequest, db: AsyncSession = D
         
     await db.delete(obj)
     await db.commit()
+    await config_versions.bump(obj.resource_id)
     return {"status": "deleted"}
 
 @router.put("/api/events/{id}")
@@ -73,18 +80,30 @@ async def update_event(id: int, event: schemas.EventUpdate, db: AsyncSession = D
     if not db_event:
         raise HTTPException(status_code=404, detail="Not found")
         
+    previous_resource_id = db_event.resource_id
     for key, value in event.dict(exclude_unset=True).items():
         setattr(db_event, key, value)
         
     await db.commit()
     await db.refresh(db_event)
+    await config_versions.bump(db_event.resource_id)
+    if previous_resource_id != db_event.resource_id:
+        await config_versions.bump(previous_resource_id)
     return db_event
+
 @router.get("/api/v1/rules/{resource_uid}")
-async def get_public_rules(resource_uid: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(models.Event)
-        .join(models.Resource, models.Resource.id == models.Event.resource_id)
-        .where(models.Resource.uid == resource_uid)
-    )
-    rules = result.scalars().all()
-    return [{"name": r.name, "trigger": r.trigger, "selector": r.selector} for r in rules]
+async def get_public_rules(resource_uid: str, request: Request, db: AsyncSession = Depends(get_db)):
+    resource = await resource_registry.resolve_uid(resource_uid)
+    if not resource:
+        return []
+
+    async def render():
+        result = await db.execute(select(models.Event).where(models.Event.resource_id == resource.id))
+        return rules_cache.payload([{"name": r.name, "trigger": r.trigger, "selector": r.selector} for r in result.scalars().all()])
+
+    # Served from cache and revalidated on every poll, so unchanged rules cost a 304
+    doc = await rules_cache.get_or_render(resource.id, resource.uid, RULES_FORMAT, render)
+    headers = {"Cache-Control": "public, no-cache", "ETag": doc.etag, "Last-Modified": doc.last_modified}
+    if doc.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=doc.body, media_type="application/json", headers=headers)
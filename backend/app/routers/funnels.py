@@ -6,12 +6,30 @@ from typing import List, Optional
 from .. import models
 from ..database import get_db, get_clickhouse_client
 from ..security import get_current_user
+from ..registry import resource_registry
+from ..ingest import split_url, normalize_path
 from pydantic import BaseModel
 from datetime import datetime
 import json
 
 router = APIRouter(tags=["Funnels"])
 
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def page_step_condition(value: str) -> str:
+    """
+    Page steps match the normalized `path` column: `/pricing` matches that page
+    exactly, `/blog/*` any page under /blog. Full URLs are reduced to their path.
+    """
+    value = value.strip()
+    if "://" in value:
+        value = split_url(value)[1]
+    if value.endswith("*"):
+        prefix = value.rstrip("*")
+        return f"startsWith(path, {_quote(prefix if prefix.startswith('/') else '/' + prefix)})"
+    return f"path = {_quote(normalize_path(value))}"
+
 class StepCreate(BaseModel):
     name: str
     type: str
@@ -90,15 +108,14 @@ async def get_funnel_stats(id: int, db: AsyncSession = Depends(get_db), current_
     conditions = []
     for s in steps:
         if s.type == 'page_view':
-            conditions.append(f"event_type = 'page_view' AND url LIKE '%{s.value}%'")
+            conditions.append(f"event_type = 'page_view' AND {page_step_condition(s.value)}")
         else:
             conditions.append(f"event_type = '{s.value}'")
             
     cond_str = ", ".join(conditions)
     
     # We need resource_uid for ClickHouse
-    res_obj = await db.execute(select(models.Resource).where(models.Resource.id == funnel.resource_id))
-    resource = res_obj.scalars().first()
+    resource = await resource_registry.resolve_id(funnel.resource_id)
     if not resource:
         print(f"Error: Resource not found for funnel {id}")
         return {"funnel_name": funnel.name, "steps": [], "total_sessions": 0, "overall_conversion": 0, "avg_ttc": 0, "error": "Resource not found"}
@@ -117,7 +134,7 @@ async def get_funnel_stats(id: int, db: AsyncSession = Depends(get_db), current_
             session_id, 
             windowFunnel(86400)({cond_str}) as level 
         FROM telemetry 
-        WHERE resource_id = '{rid}'
+        WHERE resource_id = '{rid}' AND is_bot = 0
         GROUP BY session_id
     ) 
     GROUP BY level 
@@ -176,7 +193,7 @@ async def get_funnel_stats(id: int, db: AsyncSession = Depends(get_db), current_
                 minIf(timestamp, {conditions[0]}) as start_ts,
                 dateDiff('second', start_ts, end_ts) as diff
             FROM telemetry
-            WHERE resource_id = '{rid}'
+            WHERE resource_id = '{rid}' AND is_bot = 0
             GROUP BY session_id
             HAVING start_ts > '1970-01-01 00:00:00' AND end_ts >= start_ts
         )
@@ -5,10 +5,11 @@ import platform
 import time
 from typing import Dict, List
 from app.security import get_current_user
-from app.database import engine, get_clickhouse_client
+from app.database import engine, clickhouse_pool
 from sqlalchemy import text
-import redis.asyncio as redis
-from app.config import settings
+from app.redis_pool import redis_client
+from app.ingest import telemetry_buffer, bot_buffer, heatmap_buffer, bot_classifier, admission, event_dedup
+from app.sdk_cache import script_cache, rules_cache
 
 router = APIRouter()
 
@@ -51,19 +52,15 @@ async def get_system_stats(current_user: dict = Depends(get_current_user)):
         print(f"Monitor: Postgres check failed: {e}")
 
     # Check Clickhouse
-    try:
-        client = get_clickhouse_client()
-        client.command("SELECT 1")
+    if clickhouse_pool.ping():
         db_status["clickhouse"] = "online"
-    except Exception as e:
-        print(f"Monitor: Clickhouse check failed: {e}")
+    else:
+        print("Monitor: Clickhouse check failed")
 
     # Check Redis
     try:
-        r = redis.from_url(settings.REDIS_URL)
-        await r.ping()
+        await redis_client.ping()
         db_status["redis"] = "online"
-        await r.close()
     except Exception as e:
         print(f"Monitor: Redis check failed: {e}")
 
@@ -97,5 +94,13 @@ async def get_system_stats(current_user: dict = Depends(get_current_user)):
             "percent": disk.percent
         },
         "processes": processes,
-        "databases": db_status
+        "databases": db_status,
+        "clickhouse_pool": clickhouse_pool.stats(),
+        "ingest": telemetry_buffer.stats(),
+        "heatmap_ingest": heatmap_buffer.stats(),
+        "bots": {"flagged_events": bot_classifier.flagged, "buffer": bot_buffer.stats()},
+        "admission": admission.stats(),
+        "dedup": event_dedup.stats(),
+        "sdk_cache": script_cache.stats(),
+        "rules_cache": rules_cache.stats()
     }
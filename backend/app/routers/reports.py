@@ -4,6 +4,8 @@ from sqlalchemy import select
 from typing import List, Optional
 from ..database import get_db, get_clickhouse_client
 from ..security import get_current_user
+from ..registry import resource_registry
+from ..ingest import WEIGHTED_EVENTS, WEIGHTED_SESSIONS, SESSION_WEIGHT
 from .. import models
 from pydantic import BaseModel
 from ..security import get_current_user
@@ -75,46 +77,48 @@ async def get_adhoc_data(req: AdhocReportReq, db: AsyncSession = Depends(get_db)
     try:
         print(f"[REPORTS] Adhoc request: metric={req.metric}, field={req.metric_field}, agg={req.aggregation}, dim={req.dimension}")
         
-        res_obj = await db.execute(select(models.Resource).where(models.Resource.id == req.resource_id))
-        resource = res_obj.scalars().first()
+        resource = await resource_registry.resolve_id(req.resource_id)
         if not resource:
             raise HTTPException(status_code=404, detail="Resource not found")
         
         rid = resource.uid
         client = get_clickhouse_client()
         
-        # 2. Build Metrics QL
-        metric_ql = "count(*)"
-        if req.metric == 'users':
-            metric_ql = "uniqExact(session_id)"
-        elif req.metric == 'sessions':
-            metric_ql = "uniq(session_id)"
+        # 2. Build Metrics QL (counts, sums and averages are scaled by sample_weight;
+        # min and max can't be, they are taken over the sampled rows only)
+        metric_ql = WEIGHTED_EVENTS
+        per_session = req.metric in ('users', 'sessions')
+        weighted = True
+        if per_session:
+            metric_ql = WEIGHTED_SESSIONS
         elif req.metric == 'revenue' or req.metric_field:
             field = req.metric_field or 'amount'
             agg = req.aggregation or 'sum'
             if agg == 'sum':
-                metric_ql = f"sum(JSONExtractFloat(payload, '{field}'))"
+                metric_ql = f"sum(JSONExtractFloat(payload, '{field}') * sample_weight)"
             elif agg == 'avg':
-                metric_ql = f"avg(JSONExtractFloat(payload, '{field}'))"
+                metric_ql = f"avgWeighted(JSONExtractFloat(payload, '{field}'), sample_weight)"
             elif agg == 'min':
                 metric_ql = f"min(JSONExtractFloat(payload, '{field}'))"
+                weighted = False
             elif agg == 'max':
                 metric_ql = f"max(JSONExtractFloat(payload, '{field}'))"
+                weighted = False
             else:
-                metric_ql = "count(*)"
+                metric_ql = WEIGHTED_EVENTS
             
         # 3. Build Dimensions QL
         dim_map = {
             'date': "toDate(timestamp)",
-            'source': "multiIf(utm_source != '', utm_source, referrer != '', domainWithoutWWW(referrer), 'Direct')",
-            'country': "lang",
-            'device': "multiIf(user_agent LIKE '%Mobi%', 'Mobile', 'Desktop')",
+            'source': "multiIf(utm_source != '', utm_source, ref_domain != '', ref_domain, 'Direct')",
+            'country': "country",
+            'device': "device",
             'event_name': "event_type"
         }
         dim_ql = dim_map.get(req.dimension, "toDate(timestamp)")
         
         # 4. Filters
-        where_clauses = [f"resource_id = '{rid}'", f"timestamp >= '{req.start_date} 00:00:00'", f"timestamp <= '{req.end_date} 23:59:59'"]
+        where_clauses = [f"resource_id = '{rid}'", "is_bot = 0", f"timestamp >= '{req.start_date} 00:00:00'", f"timestamp <= '{req.end_date} 23:59:59'"]
         
         if req.filters:
             for f in req.filters:
@@ -123,31 +127,40 @@ async def get_adhoc_data(req: AdhocReportReq, db: AsyncSession = Depends(get_db)
                 if key and val:
                     col_map = {
                         'source': 'utm_source',
-                        'country': 'lang',
-                        'device': 'user_agent',
                         'event_name': 'event_type'
                     }
                     col = col_map.get(key, key)
-                    if col == 'user_agent':
-                        where_clauses.append(f"user_agent LIKE '%{val}%'")
-                    else:
-                        where_clauses.append(f"{col} = '{val}'")
+                    where_clauses.append(f"{col} = '{val}'")
                     
         where_str = " AND ".join(where_clauses)
         
-        query = f"""
-            SELECT {dim_ql} as dim, {metric_ql} as val
-            FROM telemetry
-            WHERE {where_str}
-            GROUP BY dim
-            ORDER BY val DESC
-            LIMIT 100
-        """
+        if per_session:
+            query = f"""
+                SELECT dim, {metric_ql} as val
+                FROM (
+                    SELECT {dim_ql} as dim, session_id, {SESSION_WEIGHT} as session_weight
+                    FROM telemetry
+                    WHERE {where_str}
+                    GROUP BY dim, session_id
+                )
+                GROUP BY dim
+                ORDER BY val DESC
+                LIMIT 100
+            """
+        else:
+            query = f"""
+                SELECT {dim_ql} as dim, {metric_ql} as val
+                FROM telemetry
+                WHERE {where_str}
+                GROUP BY dim
+                ORDER BY val DESC
+                LIMIT 100
+            """
         
         print(f"[REPORTS] Executing CH query: {query}")
         result = client.query(query).result_rows
         formatted = [{"label": str(r[0]), "value": round(float(r[1]), 2) if r[1] is not None else 0} for r in result]
-        return {"data": formatted}
+        return {"data": formatted, "weighted": weighted}
     except Exception as e:
         print(f"[REPORTS] Adhoc execution error: {str(e)}")
         traceback.print_exc()
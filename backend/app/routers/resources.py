@@ -6,6 +6,8 @@ from .. import models
 from ..schemas import schemas
 from ..database import get_db
 from ..security import check_admin_auth, requires_admin, get_current_user
+from ..registry import resource_registry
+from ..sdk_cache import config_versions
 
 router = APIRouter(tags=["Resources"])
 
@@ -20,6 +22,7 @@ async def create_resource(resource: schemas.ResourceCreate, db: AsyncSession = D
     db.add(db_resource)
     await db.commit()
     await db.refresh(db_resource)
+    await resource_registry.invalidate()
     return db_resource
 
 @router.put("/api/resources/{resource_id}", response_model=schemas.Resource)
@@ -36,6 +39,8 @@ async def update_resource(resource_id: int, resource_update: schemas.ResourceUpd
 
     await db.commit()
     await db.refresh(db_resource)
+    await resource_registry.invalidate()
+    await config_versions.bump(db_resource.id)
     return db_resource
 
 @router.delete("/api/resources/{resource_id}")
@@ -51,4 +56,6 @@ async def delete_resource(resource_id: int, req: schemas.DeleteRequest, db: Asyn
         
     await db.delete(db_resource)
     await db.commit()
+    await resource_registry.invalidate()
+    await config_versions.bump(resource_id)
     return {"status": "deleted"}
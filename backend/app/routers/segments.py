@@ -6,6 +6,7 @@ import json
 from .. import models
 from ..database import get_db, get_clickhouse_client
 from ..security import get_current_user
+from ..registry import resource_registry
 from pydantic import BaseModel
 from ..segmentation import generate_segment_query, generate_segment_count_query
 
@@ -77,8 +78,7 @@ async def preview_segment(
     if not segment:
         raise HTTPException(status_code=404, detail="Segment not found")
     
-    res_obj = await db.execute(select(models.Resource).where(models.Resource.id == segment.resource_id))
-    resource = res_obj.scalars().first()
+    resource = await resource_registry.resolve_id(segment.resource_id)
     
     config = json.loads(segment.config)
     rid = resource.uid
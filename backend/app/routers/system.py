@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..database import get_db
@@ -117,6 +117,13 @@ async def reset_password(db: AsyncSession = Depends(get_db), admin = Depends(req
         pass
         
     return {"status": "success", "message": f"Reset link sent to {user.email}"}
+
+@router.post("/api/system/backfill/user-agents")
+async def backfill_user_agent_columns(background_tasks: BackgroundTasks, admin = Depends(requires_admin)):
+    from ..tasks.backfill import backfill_user_agents
+    background_tasks.add_task(backfill_user_agents)
+    return {"status": "started", "message": "Device, OS and browser columns are being filled for existing events."}
+
 @router.post("/api/system/backup")
 async def create_backup(admin = Depends(requires_admin)):
     backup_dir = "/app/data/backups"
@@ -6,6 +6,7 @@ from .. import models
 from ..schemas import schemas
 from ..database import get_db
 from ..security import check_admin_auth, requires_admin, get_current_user
+from ..sdk_cache import config_versions
 
 router = APIRouter(tags=["Tags"])
 
@@ -23,6 +24,7 @@ async def create_tag(tag: schemas.TagCreate, db: AsyncSession = Depends(get_db),
     db.add(db_tag)
     await db.commit()
     await db.refresh(db_tag)
+    await config_versions.bump(db_tag.resource_id)
     return db_tag
 
 @router.delete("/api/tags/{id}")
@@ -38,4 +40,5 @@ async def delete_tag(id: int, req: schemas.DeleteRequest, db: AsyncSession = Dep
         
     await db.delete(obj)
     await db.commit()
+    await config_versions.bump(obj.resource_id)
     return {"status": "deleted"}
@@ -1,11 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import List, Optional
 import json
-from .. import models
 from ..database import get_db, get_clickhouse_client
 from ..security import get_current_user
+from ..registry import resource_registry
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -39,8 +38,7 @@ async def get_user_timeline(
     current_user = Depends(get_current_user)
 ):
     # 1. Resolve Resource
-    res_obj = await db.execute(select(models.Resource).where(models.Resource.id == resource_id))
-    resource = res_obj.scalars().first()
+    resource = await resource_registry.resolve_id(resource_id)
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
     
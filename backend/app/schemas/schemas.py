@@ -1,7 +1,10 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
+# What ingest does with events classified as bots
+BotPolicy = Literal["flag", "drop", "separate"]
+
 class UserBase(BaseModel):
     email: EmailStr
 
@@ -23,11 +26,15 @@ class ResourceBase(BaseModel):
     type: str
     token: Optional[str] = None
     status: str = "Active"
+    bot_policy: BotPolicy = "flag"
+    sample_rate: float = Field(1.0, gt=0, le=1)
 
 class ResourceCreate(ResourceBase): pass
 class ResourceUpdate(BaseModel):
     name: Optional[str] = None
     status: Optional[str] = None
+    bot_policy: Optional[BotPolicy] = None
+    sample_rate: Optional[float] = Field(None, gt=0, le=1)
 class Resource(ResourceBase):
     id: int
     created_at: datetime
@@ -0,0 +1,54 @@
+import gzip
+import hashlib
+from typing import Dict, Optional, Tuple
+
+import brotli
+import rjsmin
+
+# In order of preference; any encoding accepted with a nonzero q qualifies
+ENCODINGS = ("br", "gzip")
+
+
+def negotiate(accept_encoding: Optional[str], available=ENCODINGS) -> str:
+    """Picks the best of `available` (br, gzip) the client accepts, else identity."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = q
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+class ScriptArtifact:
+    """
+    A script minified once and held with its gzip and brotli encodings, so
+    serving it is a dict lookup handing prebuilt bytes to the response.
+    Each encoding gets its own strong ETag, as RFC 9110 requires.
+    """
+
+    __slots__ = ("source", "digest", "variants", "etags")
+
+    def __init__(self, source: str):
+        self.source = source
+        body = rjsmin.jsmin(source).encode()
+        self.digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.variants: Dict[str, bytes] = {"identity": body}
+        for encoding, data in (("gzip", gzip.compress(body, 9, mtime=0)), ("br", brotli.compress(body, quality=11))):
+            if len(data) < len(body):
+                self.variants[encoding] = data
+        self.etags = {
+            encoding: f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[str, bytes, str]:
+        encoding = negotiate(accept_encoding, self.variants)
+        return encoding, self.variants[encoding], self.etags[encoding]
@@ -0,0 +1,172 @@
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+from .redis_pool import redis_client
+from .sdk_build import ScriptArtifact
+
+logger = logging.getLogger("teleboard")
+
+# How long a process trusts its copy of a resource's config version before
+# asking Redis again; bumps made by this process apply immediately
+VERSION_CHECK_INTERVAL = 5.0
+
+
+def version_key(resource_id: int) -> str:
+    return f"ot:sdk:version:{resource_id}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ConfigVersions:
+    """
+    Per-resource config version: a Redis counter bumped whenever the
+    resource, its tags or its event rules change. Caches key their entries
+    by it, so nothing has to be deleted on change: the next request misses.
+    """
+
+    def __init__(self):
+        self._versions: Dict[int, Tuple[int, float]] = {}
+
+    async def get(self, resource_id: int) -> int:
+        cached = self._versions.get(resource_id)
+        now = time.monotonic()
+        if cached and now - cached[1] < VERSION_CHECK_INTERVAL:
+            return cached[0]
+        version = int(await redis_client.get(version_key(resource_id)) or 0)
+        self._versions[resource_id] = (version, now)
+        return version
+
+    async def bump(self, resource_id: Optional[int]):
+        """Invalidates everything cached for the resource, in all processes."""
+        if resource_id is None:
+            return
+        try:
+            version = await redis_client.incr(version_key(resource_id))
+            self._versions[resource_id] = (version, time.monotonic())
+        except Exception as e:
+            self._versions.pop(resource_id, None)
+            logger.error(f"SDK cache invalidation failed: {e}")
+
+
+config_versions = ConfigVersions()
+
+
+class VersionedCache:
+    """
+    Documents derived from a resource's config, rendered at most once per
+    process per config version. The rendered payload is shared through Redis;
+    each process keeps its own built form (`build`) in memory.
+
+    The caller's `build_id` is folded into the key so a deploy that changes
+    the rendering never serves a payload made by the previous release.
+    """
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def build(self, payload: str) -> Any:
+        return payload
+
+    def _remember(self, uid: str, key: str, payload: str) -> Any:
+        built = self.build(payload)
+        self._entries[uid] = (key, built)
+        return built
+
+    async def _load(self, uid: str, key: str) -> Optional[Any]:
+        try:
+            payload = await redis_client.get(f"ot:{self.name}:{uid}:{key}")
+        except Exception as e:
+            logger.error(f"{self.name} cache read failed: {e}")
+            return None
+        return self._remember(uid, key, payload.decode()) if payload is not None else None
+
+    async def get_or_render(self, resource_id: int, uid: str, build_id: str,
+                            render: Callable[[], Awaitable[str]]) -> Any:
+        try:
+            key = f"{build_id}:{await config_versions.get(resource_id)}"
+        except Exception as e:
+            # Serving an uncached document beats failing the request
+            logger.error(f"{self.name} cache version lookup failed: {e}")
+            return self.build(await render())
+
+        entry = self._entries.get(uid)
+        if entry and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+
+        async with self._locks.setdefault(uid, asyncio.Lock()):
+            entry = self._entries.get(uid)
+            cached = entry[1] if entry and entry[0] == key else await self._load(uid, key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+            payload = await render()
+            try:
+                await redis_client.set(f"ot:{self.name}:{uid}:{key}", payload, ex=self.ttl)
+            except Exception as e:
+                logger.error(f"{self.name} cache write failed: {e}")
+            return self._remember(uid, key, payload)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._entries)}
+
+
+class ScriptCache(VersionedCache):
+    """Tracking script bootstraps: the source in Redis, the minified, precompressed artifact in memory."""
+
+    def build(self, payload: str) -> ScriptArtifact:
+        return ScriptArtifact(payload)
+
+
+class RulesDocument:
+    __slots__ = ("body", "etag", "modified", "last_modified")
+
+    def __init__(self, body: bytes, modified: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.modified = int(modified)
+        self.last_modified = email.utils.formatdate(self.modified, usegmt=True)
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        # If-None-Match wins when both are sent (RFC 9110 13.2.2)
+        if if_none_match:
+            return etag_matches(if_none_match, self.etag)
+        if if_modified_since:
+            try:
+                return email.utils.parsedate_to_datetime(if_modified_since).timestamp() >= self.modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class RulesCache(VersionedCache):
+    """Public event rules JSON, stamped with the time it was rendered for Last-Modified."""
+
+    @staticmethod
+    def payload(rules: list) -> str:
+        return json.dumps({"modified": time.time(), "rules": rules})
+
+    def build(self, payload: str) -> RulesDocument:
+        data = json.loads(payload)
+        return RulesDocument(json.dumps(data["rules"], separators=(",", ":")).encode(), data["modified"])
+
+
+script_cache = ScriptCache("sdk", ttl=settings.SDK_CACHE_TTL)
+rules_cache = RulesCache("rules", ttl=settings.SDK_CACHE_TTL)
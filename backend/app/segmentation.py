@@ -27,8 +27,6 @@ def translate_dsl_to_sql(rid, dsl_dict):
             # Map frontend fields to ClickHouse columns
             field_map = {
                 "source": "utm_source",
-                "country": "lang", # proxy
-                "device": "user_agent" # proxy or simplified
             }
             ch_field = field_map.get(field, field)
             
@@ -69,7 +67,7 @@ def generate_segment_query(rid, dsl_dict, limit=1000):
     SELECT 
         session_id as identity
     FROM telemetry
-    WHERE resource_id = '{rid}'
+    WHERE resource_id = '{rid}' AND is_bot = 0
     GROUP BY identity
     HAVING {having_clause}
     LIMIT {limit}
@@ -84,7 +82,7 @@ def generate_segment_count_query(rid, dsl_dict):
         SELECT 
             session_id
         FROM telemetry
-        WHERE resource_id = '{rid}'
+        WHERE resource_id = '{rid}' AND is_bot = 0
         GROUP BY session_id
         HAVING {having_clause}
     )
@@ -0,0 +1,262 @@
+(function() {
+    'use strict';
+
+    // Per-resource settings come from the small bootstrap served at /sdk/t.js;
+    // this file is identical for every site, so browsers cache it once
+    var boot = window.__ot_config;
+    if (!boot || !boot.rid || (window.ot && window.ot.init)) return;
+
+    var CONFIG = {
+        rid: boot.rid,
+        api: boot.api,
+        flushInterval: 2000,
+        maxQueue: 10,
+        compressMin: 1024
+    };
+
+    var utils = {
+        uuid: function() { return 'ot-' + Math.random().toString(36).substr(2, 9) + '-' + Date.now(); },
+        // Per click: varints of x (thousandths of the viewport), zigzag y delta and t delta, base64url
+        encodeClicks: function(clicks) {
+            var bytes = [], py = 0, pt = 0;
+            function varint(n) {
+                while (n > 127) { bytes.push((n % 128) + 128); n = Math.floor(n / 128); }
+                bytes.push(n);
+            }
+            clicks.forEach(function(c) {
+                var dy = c.y - py;
+                varint(c.x);
+                varint(dy < 0 ? -dy * 2 - 1 : dy * 2);
+                varint(Math.max(0, c.t - pt));
+                py = c.y;
+                pt = Math.max(pt, c.t);
+            });
+            return btoa(String.fromCharCode.apply(null, bytes)).replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+        },
+        getParams: function() {
+            var p = {};
+            var s = window.location.search.substring(1).split('&');
+            for(var i=0; i<s.length; i++) {
+                var pair = s[i].split('=');
+                if(pair[0]) p[pair[0]] = decodeURIComponent(pair[1] || "");
+            }
+            return p;
+        }
+    };
+
+    var ot = {
+        sid: null,
+        startTime: Date.now(),
+        maxScroll: 0,
+        rules: boot.rules || [],
+        tags: boot.tags || [],
+        clicks: [],
+        queue: [],
+        flushTimer: null,
+        
+        init: function() {
+            this.sid = localStorage.getItem('_ot_sid');
+            if (!this.sid) {
+                this.sid = utils.uuid();
+                localStorage.setItem('_ot_sid', this.sid);
+            }
+            
+            // Auto capture click IDs from URL
+            var p = utils.getParams();
+            if (p.fbclid) localStorage.setItem('_ot_fbclid', p.fbclid);
+            if (p.ttclid) localStorage.setItem('_ot_ttclid', p.ttclid);
+            
+            // page_exit reuses the page view's id, so exits reported twice (beforeunload, then again) are dropped at ingest
+            this.pvid = utils.uuid();
+            this.track('page_view', null, this.pvid);
+            this.setupListeners();
+            this.initRules();
+            this.injectTags();
+            
+            // Heartbeat/Time on site tracking
+            var self = this;
+            window.addEventListener('beforeunload', function() {
+                self.flushHeatmap();
+                self.track('page_exit', {
+                    duration: Math.round((Date.now() - self.startTime) / 1000),
+                    scroll_depth: self.maxScroll
+                }, self.pvid + ':exit');
+                self.flush(true);
+            });
+
+            // Deliver whatever is queued before the page may be frozen or discarded
+            document.addEventListener('visibilitychange', function() {
+                if (document.visibilityState === 'hidden') {
+                    self.flushHeatmap();
+                    self.flush(true);
+                }
+            });
+            window.addEventListener('pagehide', function() { self.flush(true); });
+        },
+        
+        flushHeatmap: function() {
+            if (this.clicks.length === 0) return;
+            this.track('heatmap_batch', { v: 1, w: window.innerWidth, c: utils.encodeClicks(this.clicks) });
+            this.clicks = [];
+        },
+        
+        track: function(event, meta, id) {
+            this.queue.push({ id: id || utils.uuid(), type: event, url: window.location.href, meta: meta || {}, qt: Date.now() });
+            if (this.queue.length >= CONFIG.maxQueue) {
+                this.flush();
+            } else if (!this.flushTimer) {
+                var self = this;
+                this.flushTimer = setTimeout(function() { self.flush(); }, CONFIG.flushInterval);
+            }
+        },
+
+        flush: function(unloading) {
+            if (this.flushTimer) {
+                clearTimeout(this.flushTimer);
+                this.flushTimer = null;
+            }
+            if (this.queue.length === 0) return;
+
+            var p = utils.getParams();
+            var now = Date.now();
+            var batch = {
+                rid: CONFIG.rid,
+                sid: this.sid,
+                ref: document.referrer,
+                res: screen.width + 'x' + screen.height,
+                lang: navigator.language,
+                utm_s: p.utm_source || "",
+                utm_m: p.utm_medium || "",
+                utm_c: p.utm_campaign || "",
+                fbclid: p.fbclid || localStorage.getItem('_ot_fbclid') || "",
+                ttclid: p.ttclid || localStorage.getItem('_ot_ttclid') || "",
+                events: this.queue.map(function(e) {
+                    return { id: e.id, type: e.type, url: e.url, meta: e.meta, dt: now - e.qt };
+                })
+            };
+            this.queue = [];
+
+            var body = JSON.stringify(batch);
+            // Compression is asynchronous, so batches sent while the page is going away stay plain
+            if (!unloading && body.length >= CONFIG.compressMin && window.CompressionStream) {
+                var self = this;
+                new Response(new Blob([body]).stream().pipeThrough(new CompressionStream('gzip'))).blob().then(function(gz) {
+                    fetch(CONFIG.api, { method: 'POST', body: gz, keepalive: true, headers: {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'} });
+                }, function() {
+                    self.send(body);
+                });
+                return;
+            }
+            this.send(body);
+        },
+
+        send: function(body) {
+            if (navigator.sendBeacon && navigator.sendBeacon(CONFIG.api, new Blob([body], {type: 'application/json'}))) return;
+            fetch(CONFIG.api, { method: 'POST', body: body, keepalive: true, headers: {'Content-Type': 'application/json'} });
+        },
+        
+        injectTags: function() {
+            this.tags.forEach(function(content) {
+                try {
+                    if (content.indexOf('<script') !== -1) {
+                        var div = document.createElement('div');
+                        div.innerHTML = content;
+                        Array.from(div.querySelectorAll('script')).forEach(oldScript => {
+                            var newScript = document.createElement('script');
+                            Array.from(oldScript.attributes).forEach(attr => newScript.setAttribute(attr.name, attr.value));
+                            newScript.appendChild(document.createTextNode(oldScript.innerHTML));
+                            document.head.appendChild(newScript);
+                        });
+                    } else {
+                        var s = document.createElement('script');
+                        s.innerHTML = content;
+                        document.head.appendChild(s);
+                    }
+                } catch(e) { console.error('OT Tag Error:', e); }
+            });
+        },
+        
+        initRules: function() {
+            var self = this;
+            var fired = {};
+            this.rules.forEach(function(rule) {
+                if (rule.trigger === 'visit') {
+                    var loc = window.location.href;
+                    var match = false;
+                    if (rule.selector === '*') match = true;
+                    else if (rule.selector.startsWith('~')) match = new RegExp(rule.selector.substring(1)).test(loc);
+                    else match = loc.includes(rule.selector);
+
+                    if (match) self.track(rule.name);
+                } else if (rule.trigger === 'click' || rule.trigger === 'submit') {
+                    var targetEvent = (rule.trigger === 'submit') ? 'submit' : 'click';
+                    document.addEventListener(targetEvent, function(e) {
+                        var el = e.target.closest(rule.selector);
+                        if (el) {
+                            self.track(rule.name);
+                        }
+                    }, true);
+                }
+            });
+            
+            // Shared scroll observer for rules and maxScroll with debouncing
+            var scrollTimeout;
+            window.addEventListener('scroll', function() {
+                if (scrollTimeout) clearTimeout(scrollTimeout);
+                scrollTimeout = setTimeout(function() {
+                    var h = document.documentElement, 
+                        b = document.body,
+                        st = 'scrollTop',
+                        sh = 'scrollHeight';
+                    var percent = (h[st]||b[st]) / ((h[sh]||b[sh]) - h.clientHeight) * 100;
+                    var s = Math.round(percent);
+                    
+                    if (s > self.maxScroll) self.maxScroll = s;
+                    
+                    self.rules.forEach(function(rule) {
+                        if (rule.trigger === 'scroll' && !fired[rule.name] && s >= parseInt(rule.selector)) {
+                            fired[rule.name] = true;
+                            self.track(rule.name, { depth: s });
+                        }
+                    });
+                }, 100);
+            }, { passive: true });
+        },
+        
+        setupListeners: function() {
+            var self = this;
+            document.addEventListener('click', function(e) {
+                // Heatmap logic
+                self.clicks.push({
+                    x: Math.min(1000, Math.round((e.pageX / window.innerWidth) * 1000)),
+                    y: Math.max(0, Math.round(e.pageY)),
+                    t: Date.now() - self.startTime
+                });
+                if (self.clicks.length >= 10) self.flushHeatmap();
+
+                // Event logic
+                var el = e.target.closest('a, button, [data-ot-track]');
+                if (el) {
+                    self.track('click', {
+                        text: el.innerText ? el.innerText.substring(0, 50).trim() : '',
+                        id: el.id,
+                        tag: el.tagName
+                    });
+                }
+            }, true);
+            
+            document.addEventListener('submit', function(e) {
+                self.track('form_submit', {
+                    id: e.target.id,
+                    action: e.target.action
+                });
+            }, true);
+        }
+    };
+
+    // Replay calls made through the bootstrap's stub before this file loaded
+    var queued = (window.ot && window.ot.q) || [];
+    window.ot = ot;
+    ot.init();
+    queued.forEach(function(args) { ot.track.apply(ot, args); });
+})();
@@ -0,0 +1,45 @@
+from app.database import get_clickhouse_client
+from app.ingest.useragent import parse_user_agent
+
+UA_LOOKUP_TABLE = "ua_backfill_lookup"
+UA_BATCH_SIZE = 10000
+
+def backfill_user_agents():
+    """
+    Fills device/os/browser for telemetry rows ingested before they were parsed at ingest.
+
+    Distinct user agents are parsed in Python with the ingest parser, loaded into a
+    Join table, and applied with a single mutation, so existing rows get exactly the
+    values new rows would.
+    """
+    client = get_clickhouse_client()
+    client.command(f"DROP TABLE IF EXISTS {UA_LOOKUP_TABLE}")
+    client.command(f"""
+        CREATE TABLE {UA_LOOKUP_TABLE} (
+            user_agent String,
+            device String,
+            os String,
+            browser String
+        ) ENGINE = Join(ANY, LEFT, user_agent)
+    """)
+    try:
+        agents = client.query("SELECT DISTINCT user_agent FROM telemetry WHERE device = ''").result_rows
+        rows = [[ua, *parse_user_agent(ua)] for (ua,) in agents]
+        for i in range(0, len(rows), UA_BATCH_SIZE):
+            client.insert(UA_LOOKUP_TABLE, rows[i:i + UA_BATCH_SIZE], column_names=["user_agent", "device", "os", "browser"])
+
+        if rows:
+            client.command(
+                f"""
+                ALTER TABLE telemetry UPDATE
+                    device = joinGet('{UA_LOOKUP_TABLE}', 'device', user_agent),
+                    os = joinGet('{UA_LOOKUP_TABLE}', 'os', user_agent),
+                    browser = joinGet('{UA_LOOKUP_TABLE}', 'browser', user_agent)
+                WHERE device = ''
+                """,
+                settings={"mutations_sync": 2, "allow_nondeterministic_mutations": 1},
+            )
+        print(f"✓ User agent backfill finished ({len(rows)} distinct agents)")
+        return len(rows)
+    finally:
+        client.command(f"DROP TABLE IF EXISTS {UA_LOOKUP_TABLE}")
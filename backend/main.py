@@ -1,9 +1,11 @@
 from fastapi import FastAPI
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text, select
 from sqlalchemy.ext.asyncio import AsyncSession
 import app.models as models
 from app.database import engine
+from app.config import settings
 from app.security import get_password_hash
 from app.routers import (
     auth_router,
@@ -34,6 +36,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+CLICKHOUSE_MIGRATION_MAX_DELAY = 30
+
+async def start_ingest():
+    """
+    Applies ClickHouse migrations, retrying until ClickHouse accepts them, then
+    starts the ingest buffers so no flush runs against an outdated schema.
+    Rows collected meanwhile wait in the buffers.
+    """
+    from app.migrations import migrate_clickhouse
+    from app.ingest import telemetry_buffer, bot_buffer, heatmap_buffer
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await asyncio.to_thread(migrate_clickhouse)
+            break
+        except Exception as e:
+            print(f"⚠ ClickHouse migration attempt {attempt} failed: {e}")
+            await asyncio.sleep(min(2 * attempt, CLICKHOUSE_MIGRATION_MAX_DELAY))
+
+    telemetry_buffer.start()
+    bot_buffer.start()
+    heatmap_buffer.start()
+    print("✓ Ingest buffers started")
+
 @app.on_event("startup")
 async def startup():
     max_retries = 10
@@ -54,6 +82,8 @@ async def startup():
                     await conn.execute(text("ALTER TABLE tags ADD COLUMN IF NOT EXISTS resource_id INTEGER REFERENCES resources(id)"))
                     await conn.execute(text("ALTER TABLE funnel_steps ADD COLUMN IF NOT EXISTS conversion_value INTEGER DEFAULT 0"))
                     await conn.execute(text("ALTER TABLE funnel_steps ADD COLUMN IF NOT EXISTS is_goal BOOLEAN DEFAULT FALSE"))
+                    await conn.execute(text("ALTER TABLE resources ADD COLUMN IF NOT EXISTS bot_policy VARCHAR DEFAULT 'flag'"))
+                    await conn.execute(text("ALTER TABLE resources ADD COLUMN IF NOT EXISTS sample_rate DOUBLE PRECISION DEFAULT 1.0"))
                 except Exception:
                     pass
 
@@ -93,24 +123,62 @@ async def startup():
         except Exception as e:
             print(f"⚠ Database initialization attempt {attempt + 1}/{max_retries} failed: {e}")
             if attempt < max_retries - 1:
-                import asyncio
                 await asyncio.sleep(retry_delay)
             else:
                 print("✗ Database initialization failed after all retries")
 
+    try:
+        from app.registry import resource_registry
+        await resource_registry.start()
+    except Exception as e:
+        print(f"⚠ Resource registry error: {e}")
+
     try:
         from app.tasks.reports import start_reports_task
         start_reports_task()
     except Exception as e:
         print(f"⚠ Reports scheduler error: {e}")
 
+    try:
+        from app.database import clickhouse_pool
+        await asyncio.to_thread(clickhouse_pool.open, settings.CLICKHOUSE_POOL_SIZE)
+        print("✓ ClickHouse pool initialized")
+    except Exception as e:
+        print(f"⚠ ClickHouse pool error: {e}")
+
+    try:
+        from app.ingest import admission
+        admission.start()
+        asyncio.create_task(start_ingest())
+    except Exception as e:
+        print(f"⚠ Ingest buffer error: {e}")
+
+    try:
+        from app.presence import run_trimmer
+        asyncio.create_task(run_trimmer())
+    except Exception as e:
+        print(f"⚠ Online presence trimmer error: {e}")
+
     try:
         from app.telemetry import send_telemetry
-        import asyncio
         asyncio.create_task(send_telemetry())
     except Exception as e:
         print(f"⚠ Telemetry initialization error: {e}")
 
+@app.on_event("shutdown")
+async def shutdown():
+    from app.ingest import telemetry_buffer, bot_buffer, heatmap_buffer, admission
+    from app.database import clickhouse_pool
+    from app.redis_pool import close_redis
+    from app.registry import resource_registry
+    await resource_registry.stop()
+    await admission.stop()
+    await telemetry_buffer.stop()
+    await bot_buffer.stop()
+    await heatmap_buffer.stop()
+    clickhouse_pool.close()
+    await close_redis()
+
 app.include_router(auth_router)
 app.include_router(resources_router)
 app.include_router(campaigns_router)
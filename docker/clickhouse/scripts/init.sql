@@ -25,10 +25,137 @@ CREATE TABLE IF NOT EXISTS telemetry (
     ttclid String,
     session_id String,
     payload String,
-    timestamp DateTime64(3) DEFAULT now64()
+    timestamp DateTime64(3) DEFAULT now64(),
+    device LowCardinality(String) DEFAULT '',
+    os LowCardinality(String) DEFAULT '',
+    browser LowCardinality(String) DEFAULT '',
+    country LowCardinality(String) DEFAULT '',
+    city LowCardinality(String) DEFAULT '',
+    host LowCardinality(String) DEFAULT '',
+    path String DEFAULT '',
+    canonical_path String DEFAULT '',
+    ref_domain LowCardinality(String) DEFAULT '',
+    is_bot UInt8 DEFAULT 0,
+    sample_weight Float32 DEFAULT 1,
+    event_id String DEFAULT '',
+    INDEX idx_host host TYPE set(1000) GRANULARITY 4,
+    INDEX idx_path path TYPE bloom_filter(0.01) GRANULARITY 4,
+    INDEX idx_canonical_path canonical_path TYPE bloom_filter(0.01) GRANULARITY 4,
+    INDEX idx_ref_domain ref_domain TYPE set(1000) GRANULARITY 4
 ) ENGINE = MergeTree()
 ORDER BY (resource_id, timestamp);
 
+-- Per-session rollup for session KPIs (bounce, duration, visitors), one row per session and day
+CREATE TABLE IF NOT EXISTS sessions (
+    resource_id String,
+    session_id String,
+    day Date,
+    start_time SimpleAggregateFunction(min, DateTime64(3)),
+    end_time SimpleAggregateFunction(max, DateTime64(3)),
+    events SimpleAggregateFunction(sum, UInt64),
+    pageviews SimpleAggregateFunction(sum, UInt64),
+    entry_url AggregateFunction(argMin, String, DateTime64(3)),
+    exit_url AggregateFunction(argMax, String, DateTime64(3)),
+    source AggregateFunction(argMin, String, DateTime64(3)),
+    device SimpleAggregateFunction(any, String),
+    sample_weight SimpleAggregateFunction(max, Float32)
+) ENGINE = AggregatingMergeTree()
+ORDER BY (resource_id, day, session_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_sessions
+TO sessions
+AS SELECT
+    resource_id,
+    session_id,
+    toDate(timestamp) as day,
+    min(timestamp) as start_time,
+    max(timestamp) as end_time,
+    count() as events,
+    countIf(event_type = 'page_view') as pageviews,
+    argMinState(url, timestamp) as entry_url,
+    argMaxState(url, timestamp) as exit_url,
+    argMinState(multiIf(utm_source != '', utm_source, ref_domain != '', ref_domain, 'Direct'), timestamp) as source,
+    any(device) as device,
+    max(sample_weight) as sample_weight
+FROM telemetry
+WHERE is_bot = 0
+GROUP BY resource_id, session_id, day;
+
+-- Heatmap clicks, one row per click; x is a fraction of the viewport width, y is page px
+CREATE TABLE IF NOT EXISTS heatmap_clicks (
+    resource_id String,
+    session_id String,
+    host LowCardinality(String),
+    canonical_path String,
+    url String,
+    timestamp DateTime64(3),
+    device LowCardinality(String),
+    viewport_width UInt16,
+    x Float32,
+    y UInt32,
+    t UInt32,
+    sample_weight Float32 DEFAULT 1
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (resource_id, host, canonical_path, timestamp);
+
+-- Daily heatmap rollup: weighted clicks per page, viewport class and grid cell
+-- (200 columns across the viewport, 10 px rows)
+CREATE TABLE IF NOT EXISTS heatmap_bins (
+    resource_id String,
+    host LowCardinality(String),
+    canonical_path String,
+    day Date,
+    viewport LowCardinality(String),
+    bx UInt8,
+    by UInt32,
+    clicks Float64
+) ENGINE = SummingMergeTree(clicks)
+ORDER BY (resource_id, host, canonical_path, day, viewport, by, bx);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_heatmap_bins
+TO heatmap_bins
+AS SELECT
+    resource_id,
+    host,
+    canonical_path,
+    toDate(timestamp) as day,
+    if(viewport_width > 0 AND viewport_width < 1024, 'mobile', 'desktop') as viewport,
+    toUInt8(least(floor(x * 200), 199)) as bx,
+    intDiv(y, 10) as by,
+    sum(sample_weight) as clicks
+FROM heatmap_clicks
+GROUP BY resource_id, host, canonical_path, day, viewport, bx, by;
+
+-- Heatmap page catalog: one row per canonical page with its click count and last click
+CREATE TABLE IF NOT EXISTS heatmap_urls (
+    resource_id String,
+    host LowCardinality(String),
+    canonical_path String,
+    url SimpleAggregateFunction(anyLast, String),
+    clicks SimpleAggregateFunction(sum, Float64),
+    last_seen SimpleAggregateFunction(max, DateTime64(3))
+) ENGINE = AggregatingMergeTree()
+ORDER BY (resource_id, host, canonical_path);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_heatmap_urls
+TO heatmap_urls
+AS SELECT
+    resource_id,
+    host,
+    canonical_path,
+    anyLast(url) as url,
+    sum(sample_weight) as clicks,
+    max(timestamp) as last_seen
+FROM heatmap_clicks
+GROUP BY resource_id, host, canonical_path;
+
+-- Traffic classified as bots, for resources that keep it apart from telemetry
+CREATE TABLE IF NOT EXISTS telemetry_bots AS telemetry
+ENGINE = MergeTree()
+ORDER BY (resource_id, timestamp)
+TTL toDateTime(timestamp) + INTERVAL 30 DAY;
+
 -- Dedicated logging table for system events
 CREATE TABLE IF NOT EXISTS system_logs (
     level String,
@@ -58,7 +185,8 @@ AS SELECT
     session_id as identity,
     min(toDate(timestamp)) as first_event_date,
     any(utm_source) as source,
-    any(lang) as country, -- mapped to lang as proxy in this schema
-    'Desktop' as device -- default as schema doesn't have explicit device yet
+    any(country) as country,
+    any(device) as device
 FROM telemetry
+WHERE is_bot = 0
 GROUP BY resource_id, identity;
@@ -7,9 +7,12 @@ const API_URL = `${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api
 export default function HeatmapsPage() {
     const { selectedResource } = useResource();
     const [urls, setUrls] = useState([]);
-    const [selectedUrl, setSelectedUrl] = useState('');
-    const [allClicks, setAllClicks] = useState([]);
-    const [displayClicks, setDisplayClicks] = useState([]);
+    const [urlSort, setUrlSort] = useState('clicks'); // 'clicks' | 'recent'
+    const [hasMoreUrls, setHasMoreUrls] = useState(false);
+    // Catalog entry: bins are looked up by its host and canonical_path, `url` is shown and framed
+    const [selectedPage, setSelectedPage] = useState(null);
+    const selectedUrl = selectedPage ? selectedPage.url : '';
+    const [bins, setBins] = useState(null);
     const [loading, setLoading] = useState(false);
 
     // Config State
@@ -34,49 +37,45 @@ export default function HeatmapsPage() {
         mobile: 3500
     };
 
-    // 1. Fetch available URLs
+    // 1. Fetch available URLs, a page at a time
+    const URL_PAGE_SIZE = 50;
+    const fetchUrls = async (offset = 0) => {
+        if (!selectedResource) return;
+        try {
+            const res = await fetch(`${API_URL}/analytics/heatmap/urls?resource_id=${selectedResource.uid}&sort=${urlSort}&limit=${URL_PAGE_SIZE}&offset=${offset}`);
+            if (res.ok) {
+                const page = await res.json();
+                setUrls(prev => offset === 0 ? page : [...prev, ...page]);
+                setHasMoreUrls(page.length === URL_PAGE_SIZE);
+            }
+        } catch (err) { console.error(err); }
+    };
+
     useEffect(() => {
-        const fetchUrls = async () => {
-            if (!selectedResource) return;
-            try {
-                const res = await fetch(`${API_URL}/analytics/heatmap/urls?resource_id=${selectedResource.uid}`);
-                if (res.ok) setUrls(await res.json());
-            } catch (err) { console.error(err); }
-        };
-        fetchUrls();
-    }, [selectedResource]);
+        fetchUrls(0);
+    }, [selectedResource, urlSort]);
 
-    // 2. Fetch click data for selected URL
+    // 2. Fetch binned click density for selected URL (server-side grid per viewport class)
     useEffect(() => {
         const fetchClicks = async () => {
-            if (!selectedUrl || !selectedResource) return;
+            if (!selectedPage || !selectedResource) return;
             setLoading(true);
             try {
-                const res = await fetch(`${API_URL}/analytics/heatmap/data?resource_id=${selectedResource.uid}&url=${encodeURIComponent(selectedUrl)}`);
+                const res = await fetch(`${API_URL}/analytics/heatmap/bins?resource_id=${selectedResource.uid}&host=${encodeURIComponent(selectedPage.host)}&canonical_path=${encodeURIComponent(selectedPage.canonical_path)}&cols=100&row_px=20`);
                 if (res.ok) {
                     const data = await res.json();
-                    setAllClicks(data);
+                    setBins(data);
                 }
             } catch (err) { console.error(err); }
             finally { setLoading(false); }
         };
         fetchClicks();
-    }, [selectedUrl, selectedResource]);
+    }, [selectedPage, selectedResource]);
 
-    // 3. Filter data for current view specs
-    useEffect(() => {
-        const filtered = allClicks.filter(c => {
-            if (!c.res) return viewMode === 'desktop';
-            const width = parseInt(c.res.split('x')[0]);
-            return viewMode === 'desktop' ? width >= 1024 : width < 1024;
-        });
-        setDisplayClicks(filtered);
-    }, [allClicks, viewMode]);
-
-    // 4. Draw Heatmap
+    // 3. Draw Heatmap
     useEffect(() => {
         drawHeatmap();
-    }, [displayClicks, opacity, radius, intensity, viewMode, bgMode, customBg]);
+    }, [bins, opacity, radius, intensity, viewMode, bgMode, customBg]);
 
     const drawHeatmap = () => {
         const canvas = canvasRef.current;
@@ -91,23 +90,29 @@ export default function HeatmapsPage() {
 
         ctx.clearRect(0, 0, width, height);
 
-        // Enhance gradient for better visibility over white/complex backgrounds
-        displayClicks.forEach(click => {
-            // click.x is normalized 0-1. click.y is absolute pixels
-            const x = click.x * width;
-            const y = click.y;
-
-            // Simple clustering/intensity boost
-            const gradient = ctx.createRadialGradient(x, y, 0, x, y, radius);
-            gradient.addColorStop(0, `rgba(255, 0, 50, ${intensity})`); // Hot center
-            gradient.addColorStop(0.4, `rgba(255, 100, 0, ${intensity * 0.7})`);
-            gradient.addColorStop(1, 'rgba(255, 0, 0, 0)');
-
-            ctx.fillStyle = gradient;
-            ctx.globalAlpha = opacity;
-            ctx.beginPath();
-            ctx.arc(x, y, radius, 0, 2 * Math.PI);
-            ctx.fill();
+        const view = bins && bins.viewports[viewMode];
+        if (!view || !view.max) return;
+
+        // Each non-empty cell is drawn at its centre, weighted by its share of the busiest cell
+        view.matrix.forEach((row, r) => {
+            const y = (r + 0.5) * bins.row_px;
+            if (y - radius > height) return;
+            row.forEach((value, c) => {
+                if (!value) return;
+                const x = ((c + 0.5) / bins.cols) * width;
+                const weight = intensity * Math.max(0.15, value / view.max);
+
+                const gradient = ctx.createRadialGradient(x, y, 0, x, y, radius);
+                gradient.addColorStop(0, `rgba(255, 0, 50, ${weight})`); // Hot center
+                gradient.addColorStop(0.4, `rgba(255, 100, 0, ${weight * 0.7})`);
+                gradient.addColorStop(1, 'rgba(255, 0, 0, 0)');
+
+                ctx.fillStyle = gradient;
+                ctx.globalAlpha = opacity;
+                ctx.beginPath();
+                ctx.arc(x, y, radius, 0, 2 * Math.PI);
+                ctx.fill();
+            });
         });
     };
 
@@ -191,24 +196,39 @@ export default function HeatmapsPage() {
             <div style={{ display: 'flex', gap: '24px', flex: 1, overflow: 'hidden' }}>
                 {/* Sidebar List */}
                 <div style={{ width: '260px', overflowY: 'auto' }} className="thin-scrollbar">
-                    <h3 style={{ fontSize: '11px', fontWeight: 800, marginBottom: '12px', color: '#94a3b8', textTransform: 'uppercase' }}>TRACKED PAGES</h3>
+                    <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '12px' }}>
+                        <h3 style={{ fontSize: '11px', fontWeight: 800, color: '#94a3b8', textTransform: 'uppercase' }}>TRACKED PAGES</h3>
+                        <select value={urlSort} onChange={e => setUrlSort(e.target.value)} style={{ fontSize: '11px', border: 'none', background: 'transparent', color: '#64748b', cursor: 'pointer' }}>
+                            <option value="clicks">Most clicks</option>
+                            <option value="recent">Most recent</option>
+                        </select>
+                    </div>
                     <div style={{ display: 'flex', flexDirection: 'column', gap: '4px' }}>
-                        {urls.map(u => (
-                            <button
-                                key={u}
-                                onClick={() => setSelectedUrl(u)}
-                                style={{
-                                    textAlign: 'left', padding: '10px 12px', borderRadius: '8px',
-                                    background: selectedUrl === u ? '#f1f5f9' : 'transparent',
-                                    color: selectedUrl === u ? '#0f172a' : '#64748b',
-                                    border: '1px solid ' + (selectedUrl === u ? '#cbd5e1' : 'transparent'),
-                                    fontSize: '13px', fontWeight: selectedUrl === u ? 700 : 500,
-                                    cursor: 'pointer', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis'
-                                }}
-                            >
-                                {u.replace(/^https?:\/\//, '')}
+                        {urls.map(u => {
+                            const active = selectedPage !== null && selectedPage.host === u.host && selectedPage.canonical_path === u.canonical_path;
+                            return (
+                                <button
+                                    key={`${u.host}${u.canonical_path}`}
+                                    onClick={() => setSelectedPage(u)}
+                                    title={`${u.clicks} clicks`}
+                                    style={{
+                                        textAlign: 'left', padding: '10px 12px', borderRadius: '8px',
+                                        background: active ? '#f1f5f9' : 'transparent',
+                                        color: active ? '#0f172a' : '#64748b',
+                                        border: '1px solid ' + (active ? '#cbd5e1' : 'transparent'),
+                                        fontSize: '13px', fontWeight: active ? 700 : 500,
+                                        cursor: 'pointer', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis'
+                                    }}
+                                >
+                                    {u.url.replace(/^https?:\/\//, '')}
+                                </button>
+                            );
+                        })}
+                        {hasMoreUrls && (
+                            <button onClick={() => fetchUrls(urls.length)} style={{ padding: '8px', fontSize: '12px', color: '#64748b', background: 'none', border: 'none', cursor: 'pointer' }}>
+                                Load more
                             </button>
-                        ))}
+                        )}
                         {urls.length === 0 && <div style={{ fontSize: '12px', color: '#94a3b8', padding: '12px' }}>No heatmap data recorded yet.</div>}
                     </div>
                 </div>
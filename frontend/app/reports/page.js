@@ -13,6 +13,7 @@ export default function ReportsPage() {
     const [reports, setReports] = useState([]);
     const [selectedReportId, setSelectedReportId] = useState('');
     const [reportData, setReportData] = useState([]);
+    const [reportWeighted, setReportWeighted] = useState(true);
     const [loading, setLoading] = useState(false);
 
     // Config State
@@ -73,6 +74,7 @@ export default function ReportsPage() {
             if (res.ok) {
                 const data = await res.json();
                 setReportData(data.data);
+                setReportWeighted(data.weighted !== false);
             } else {
                 const err = await res.json();
                 alert(`Error: ${err.detail || 'Failed to run report'}`);
@@ -325,6 +327,9 @@ export default function ReportsPage() {
                                 </h2>
                                 <h1 style={{ fontSize: '32px', fontWeight: 800, letterSpacing: '-0.03em', color: '#0f172a' }}>{totalValue.toLocaleString()}</h1>
                                 <p style={{ fontSize: '14px', color: '#64748b' }}>{startDate} — {endDate}</p>
+                                {!reportWeighted && (
+                                    <p style={{ fontSize: '12px', color: '#94a3b8', marginTop: '8px' }}>{t('reports.unweighted')}</p>
+                                )}
                             </div>
 
                             {chartType === 'bar' && (
@@ -307,6 +307,7 @@ export const translations = {
         period: "Analysis Period",
         save: "Save Report",
         adhoc: "Run Ad-hoc",
+        unweighted: "Min and max are taken over sampled events only and are not scaled to full traffic.",
         metrics: {
           users: "Unique Users",
           sessions: "Total Sessions",
@@ -1029,6 +1030,7 @@ export const translations = {
       period: "Період аналізу",
       save: "Зберегти звіт",
       adhoc: "Запустити",
+      unweighted: "Мінімум і максимум рахуються лише за вибіркою подій і не масштабуються на весь трафік.",
       metrics: {
         users: "Унікальні користувачі",
         sessions: "Всього сесій",
@@ -0,0 +1,72 @@
+"""Shared fixtures."""
+import datetime
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+DATETIME_TYPE = re.compile(r"(?:Nullable\(|SimpleAggregateFunction\(\w+, )?DateTime")
+INIT_SQL = Path(__file__).resolve().parent.parent / "docker" / "clickhouse" / "scripts" / "init.sql"
+
+
+class EmbeddedResult:
+    def __init__(self, rows):
+        self.result_rows = rows
+        self.first_row = rows[0] if rows else None
+
+
+class EmbeddedClickHouse:
+    """The part of the clickhouse_connect client the routers use, over a chdb session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    @staticmethod
+    def _render(sql, parameters):
+        def literal(match):
+            value = (parameters or {})[match.group(1)]
+            if isinstance(value, (int, float)):
+                return repr(value)
+            return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+        return re.sub(r"\{(\w+):[^}]+\}", literal, sql)
+
+    def command(self, sql, parameters=None, settings=None):
+        if settings:
+            sql += " SETTINGS " + ", ".join(f"{name} = {value}" for name, value in settings.items())
+        self.session.query(self._render(sql, parameters))
+
+    def insert(self, table, data, column_names):
+        rows = ", ".join(
+            "(" + ", ".join(self._render("{v:String}", {"v": value}) for value in row) + ")" for row in data
+        )
+        self.session.query(f"INSERT INTO {table} ({', '.join(column_names)}) VALUES {rows}")
+
+    def query(self, sql, parameters=None, settings=None):
+        out = self.session.query(
+            self._render(sql, parameters) + " SETTINGS output_format_json_quote_64bit_integers = 0", "JSONCompact"
+        )
+        text = out.bytes().decode()
+        if not text.strip():
+            return EmbeddedResult([])
+        data = json.loads(text)
+        # Top-level DateTime columns come back as datetimes, as with clickhouse_connect
+        dates = [bool(DATETIME_TYPE.match(m["type"])) for m in data["meta"]]
+        rows = [
+            tuple(datetime.datetime.fromisoformat(v) if is_date and v else v for v, is_date in zip(row, dates))
+            for row in data["data"]
+        ]
+        return EmbeddedResult(rows)
+
+
+@pytest.fixture
+def clickhouse(tmp_path):
+    """Embedded ClickHouse (chdb) with the schema of init.sql; skipped when chdb isn't installed."""
+    chdb_session = pytest.importorskip("chdb.session")
+    session = chdb_session.Session(str(tmp_path))
+    for statement in re.split(r";\s*\n", INIT_SQL.read_text()):
+        sql = "\n".join(line for line in statement.splitlines() if not line.strip().startswith("--")).strip()
+        if sql:
+            session.query(sql.rstrip(";"))
+    yield EmbeddedClickHouse(session)
+    session.close()
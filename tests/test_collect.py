@@ -0,0 +1,105 @@
+"""Tests for the collect endpoints."""
+import datetime
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.ingest.admission import PRIORITY_HIGH, PRIORITY_LOW
+from backend.app.ingest.buffer import TELEMETRY_COLUMNS
+from backend.app.ingest.dedup import EventDeduplicator
+from backend.app.registry import resource_registry
+from backend.app.routers import analytics
+
+CHROME = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+
+async def _noop(*args, **kwargs):
+    pass
+
+
+@pytest.fixture
+def collect(monkeypatch):
+    """A client for the collect router whose telemetry rows land in `collect.rows`."""
+    class Collect:
+        rows = []
+        full = False
+
+        @staticmethod
+        def post(path, body):
+            return client.post(path, content=json.dumps(body), headers={"user-agent": CHROME})
+
+    def add(row):
+        if Collect.full:
+            return False
+        Collect.rows.append(row)
+        return True
+
+    monkeypatch.setattr(analytics.telemetry_buffer, "add", add)
+    monkeypatch.setattr(analytics, "refresh_session", _noop)
+    monkeypatch.setattr(analytics, "send_to_conversion_api", _noop)
+    monkeypatch.setattr(analytics, "event_dedup", EventDeduplicator(window=600, capacity=1000, error_rate=0.001))
+    # An unloaded registry accepts every resource id
+    monkeypatch.setattr(resource_registry, "loaded", False)
+    app = FastAPI()
+    app.include_router(analytics.router)
+    client = TestClient(app)
+    return Collect
+
+
+def test_events_refused_on_a_full_queue_can_be_retried(collect):
+    beacon = {"rid": "OT-1", "sid": "s1", "type": "page_view", "eid": "e1"}
+    collect.full = True
+    assert collect.post("/api/v1/collect", beacon).json()["message"] == "Ingest queue is full"
+    collect.full = False
+    assert collect.post("/api/v1/collect", beacon).json() == {"status": "success"}
+    assert collect.post("/api/v1/collect", beacon).json() == {"status": "duplicate"}
+    assert len(collect.rows) == 1
+
+    batch = {"rid": "OT-1", "sid": "s1", "events": [{"type": "page_view", "id": "b1"}, {"type": "page_view", "id": "b1"}]}
+    collect.full = True
+    collect.post("/api/v1/collect/batch", batch)
+    collect.full = False
+    # Repeated ids within a batch are dropped too
+    assert collect.post("/api/v1/collect/batch", batch).json()["accepted"] == 1
+    assert collect.post("/api/v1/collect/batch", batch).json() == {"status": "duplicate"}
+
+
+def test_batch_rows_are_backdated_and_in_column_order(collect):
+    batch = {
+        "rid": "OT-1", "sid": "s1", "url": "https://a.io/", "ref": "https://www.google.com/", "res": "1280x800",
+        "events": [
+            {"type": "page_view", "id": "e1"},
+            {"type": "signup", "url": "https://a.io/join?utm_source=x", "dt": 5000, "id": "e2"},
+            # Delays beyond an hour are clamped
+            {"type": "click", "dt": 10 ** 9, "id": "e3"},
+        ],
+    }
+    assert collect.post("/api/v1/collect/batch", batch).json() == {"status": "success", "accepted": 3, "shed": 0}
+
+    rows = [dict(zip(TELEMETRY_COLUMNS, row)) for row in collect.rows]
+    assert all(len(row) == len(TELEMETRY_COLUMNS) for row in collect.rows)
+    assert [r["event_type"] for r in rows] == ["page_view", "signup", "click"]
+    assert [r["event_id"] for r in rows] == ["e1", "e2", "e3"]
+    assert [r["url"] for r in rows] == ["https://a.io/", "https://a.io/join?utm_source=x", "https://a.io/"]
+    assert {(r["resource_id"], r["session_id"], r["screen_res"], r["ref_domain"]) for r in rows} == {("OT-1", "s1", "1280x800", "google.com")}
+    assert rows[1]["canonical_path"] == "/join"
+    assert rows[0]["timestamp"] - rows[1]["timestamp"] == datetime.timedelta(seconds=5)
+    assert rows[0]["timestamp"] - rows[2]["timestamp"] == datetime.timedelta(hours=1)
+
+
+@pytest.mark.parametrize("refused, status, body", [
+    (PRIORITY_LOW, 200, {"status": "success", "accepted": 1, "shed": 1}),
+    (PRIORITY_HIGH, 429, {"status": "error", "message": "Rate limited"}),
+])
+def test_batch_sheds_only_lower_priority_events(collect, monkeypatch, refused, status, body):
+    monkeypatch.setattr(analytics.admission, "admit", lambda rid, priority: priority != refused)
+    batch = {"rid": "OT-1", "sid": "s1", "events": [{"type": "page_view", "id": "e1"}, {"type": "click", "id": "e2"}]}
+
+    res = collect.post("/api/v1/collect/batch", batch)
+    assert (res.status_code, res.json()) == (status, body)
+    if refused == PRIORITY_HIGH:
+        # Nothing is stored, so the client can resend the whole batch
+        assert res.headers["retry-after"] == "1"
+        assert collect.rows == []
@@ -0,0 +1,79 @@
+"""Tests for the dashboard stats endpoint."""
+import asyncio
+import datetime
+
+import pytest
+
+from backend.app import presence
+from backend.app.routers import analytics
+
+
+@pytest.fixture
+def online(monkeypatch):
+    calls = []
+
+    async def online_count(resource_id=None, ttl=presence.SESSION_TTL):
+        calls.append(resource_id)
+        return 7
+
+    monkeypatch.setattr(presence, "online_count", online_count)
+    return calls
+
+
+def stats(**kwargs):
+    return asyncio.run(analytics.get_dashboard_stats(db=None, current_user=None, **kwargs))
+
+
+def test_last_24_hours_come_from_one_query_and_are_padded(monkeypatch, online):
+    hour = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    queries = []
+
+    class Client:
+        class Result:
+            first_row = (
+                [(hour, "Desktop", 6), (hour, "Mobile", 2), (hour - datetime.timedelta(hours=3), "Desktop", 4)],
+                5, 2, 125.7,
+            )
+
+        def query(self, sql, parameters=None, settings=None):
+            queries.append((sql, parameters))
+            return self.Result()
+
+    monkeypatch.setattr(analytics, "get_clickhouse_client", Client)
+
+    res = stats(resource_id="OT-1")
+    assert len(queries) == 1
+    assert queries[0][1] == {"rid": "OT-1"}
+    assert online == ["OT-1"]
+    assert (res["visitors"], res["views"], res["online"]) == (5, 12, 7)
+    assert (res["bounce"], res["session"]) == ("40%", "2m 5s")
+    assert res["audience"] == {"Desktop": 83, "Mobile": 16}
+    # One point per hour, oldest first, scaled to the busiest hour
+    assert len(res["chart_data"]) == 24
+    assert res["chart_data"][-1] == 100 and res["chart_data"][-4] == 50
+    assert sum(res["chart_data"]) == 150
+
+
+def test_date_range_stats_from_telemetry_and_the_sessions_rollup(clickhouse, monkeypatch, online):
+    monkeypatch.setattr(analytics, "get_clickhouse_client", lambda: clickhouse)
+
+    def track(rid, session_id, ts, device, weight=1, is_bot=0):
+        clickhouse.command(
+            "INSERT INTO telemetry (resource_id, session_id, event_type, url, timestamp, device, sample_weight, is_bot) "
+            f"VALUES ('{rid}', '{session_id}', 'page_view', 'https://a.io/', '2026-01-01 {ts}', '{device}', {weight}, {is_bot})"
+        )
+
+    # s1 spans two inserts, so its session row is merged at query time
+    track("OT-1", "s1", "10:00:00", "Desktop")
+    track("OT-1", "s1", "10:02:00", "Desktop")
+    # s2 was sampled at 50% and bounced
+    track("OT-1", "s2", "11:00:00", "Mobile", weight=2)
+    track("OT-1", "b1", "11:30:00", "Desktop", is_bot=1)
+    track("OT-2", "s9", "11:30:00", "Desktop")
+
+    res = stats(resource_id="OT-1", start="2026-01-01", end="2026-01-01")
+    assert (res["visitors"], res["views"]) == (3, 4)
+    assert (res["bounce"], res["session"]) == ("66%", "2m 0s")
+    assert res["audience"] == {"Desktop": 50, "Mobile": 50}
+    assert res["chart_data"] == [100, 100]
+    assert res["online"] == 7
@@ -0,0 +1,121 @@
+"""Tests for the heatmap endpoints and their ClickHouse rollups."""
+import asyncio
+
+from backend.app import migrations
+from backend.app.routers import analytics
+
+PAGE = "https://a.io/pricing?utm_source=x"
+
+
+class RecordingClient:
+    """Answers every query with canned rows and keeps the queries it was sent."""
+
+    class Result:
+        def __init__(self, rows):
+            self.result_rows = rows
+            self.first_row = rows[0] if rows else None
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query(self, sql, parameters=None, settings=None):
+        self.queries.append((sql, parameters))
+        return self.Result(self.rows)
+
+
+def add_clicks(clickhouse, clicks, day="2026-01-01", path="/pricing", url=PAGE):
+    values = ", ".join(
+        f"('OT-1', 's1', 'a.io', '{path}', '{url}', '{day} 12:00:00', 'Desktop', {width}, {x}, {y}, 0, {weight})"
+        for width, x, y, weight in clicks
+    )
+    clickhouse.command(f"INSERT INTO heatmap_clicks VALUES {values}")
+
+
+def test_bins_fold_the_daily_grid_into_the_requested_one(clickhouse, monkeypatch):
+    monkeypatch.setattr(analytics, "get_clickhouse_client", lambda: clickhouse)
+    add_clicks(clickhouse, [
+        (1280, 0.0, 5, 1), (1280, 0.5, 25, 1), (1280, 1.0, 25, 1),
+        # No viewport width (older SDKs) counts as desktop
+        (0, 0.999, 5, 1),
+        # Sampled at 50%: one stored click stands for two
+        (375, 0.25, 45, 2),
+    ])
+    add_clicks(clickhouse, [(1280, 0.5, 5, 1)], day="2026-02-01")
+
+    bins = asyncio.run(analytics.get_heatmap_bins(
+        resource_id="OT-1", host="a.io", canonical_path="/pricing", cols=4, row_px=20, start="2026-01-01", end="2026-01-31"
+    ))
+    assert (bins["cols"], bins["row_px"]) == (4, 20)
+    assert bins["viewports"]["desktop"] == {
+        "rows": 2, "total": 4, "max": 1.0, "matrix": [[1.0, 0.0, 0.0, 1.0], [0.0, 0.0, 1.0, 1.0]],
+    }
+    assert bins["viewports"]["mobile"] == {
+        "rows": 3, "total": 2, "max": 2.0, "matrix": [[0.0] * 4, [0.0] * 4, [0.0, 2.0, 0.0, 0.0]],
+    }
+
+
+def test_bins_request_is_clamped_to_the_base_grid(monkeypatch):
+    client = RecordingClient([("desktop", 0, 0, 3.0)])
+    monkeypatch.setattr(analytics, "get_clickhouse_client", lambda: client)
+
+    bins = asyncio.run(analytics.get_heatmap_bins(
+        resource_id="OT-1", host="a.io", canonical_path="/pricing", cols=10_000, row_px=1
+    ))
+    assert (bins["cols"], bins["row_px"]) == (analytics.BIN_COLUMNS, analytics.BIN_ROW_PX)
+    assert bins["viewports"]["mobile"] == {"rows": 0, "total": 0, "max": 0, "matrix": []}
+    (sql, params), = client.queries
+    assert "day >=" not in sql
+    assert params["max_by"] == analytics.MAX_HEATMAP_ROWS
+    assert (params["host"], params["page"]) == ("a.io", "/pricing")
+
+
+def test_catalog_folds_unmerged_parts_and_sorts(clickhouse, monkeypatch):
+    monkeypatch.setattr(analytics, "get_clickhouse_client", lambda: clickhouse)
+    # Each insert lands in its own part of heatmap_urls
+    add_clicks(clickhouse, [(1280, 0.5, 5, 1)] * 2, day="2026-01-01")
+    add_clicks(clickhouse, [(1280, 0.5, 5, 2)], day="2026-01-02")
+    add_clicks(clickhouse, [(1280, 0.5, 5, 1)] * 2, day="2026-01-03", path="/docs", url="https://a.io/docs")
+
+    busiest = asyncio.run(analytics.get_heatmap_urls(resource_id="OT-1"))
+    assert busiest == [
+        {"host": "a.io", "canonical_path": "/pricing", "url": PAGE, "clicks": 4, "last_seen": "2026-01-02T12:00:00"},
+        {"host": "a.io", "canonical_path": "/docs", "url": "https://a.io/docs", "clicks": 2,
+         "last_seen": "2026-01-03T12:00:00"},
+    ]
+    recent = asyncio.run(analytics.get_heatmap_urls(resource_id="OT-1", sort="recent", limit=1))
+    assert [page["url"] for page in recent] == ["https://a.io/docs"]
+    second = asyncio.run(analytics.get_heatmap_urls(resource_id="OT-1", sort="recent", limit=1, offset=1))
+    assert [page["url"] for page in second] == [PAGE]
+
+
+def test_catalog_clamps_paging_and_ignores_unknown_sorts(monkeypatch):
+    client = RecordingClient([])
+    monkeypatch.setattr(analytics, "get_clickhouse_client", lambda: client)
+
+    assert asyncio.run(analytics.get_heatmap_urls(resource_id="OT-1", sort="x; DROP", limit=10**6, offset=-5)) == []
+    (sql, params), = client.queries
+    assert "DROP" not in sql and analytics.HEATMAP_URL_ORDER["clicks"] in sql
+    assert (params["limit"], params["offset"]) == (1000, 0)
+
+
+def test_pages_migrated_from_telemetry_are_found_by_their_catalog_key(clickhouse, monkeypatch):
+    monkeypatch.setattr(analytics, "get_clickhouse_client", lambda: clickhouse)
+    monkeypatch.setattr(migrations, "get_clickhouse_client", lambda: clickhouse)
+    # Click batches stored in telemetry before 0004 added the URL columns
+    for url, x in [("https://a.io/p?id=5&utm_source=x", 0.25), ("https://a.io/p?id=6", 0.75)]:
+        clickhouse.command(
+            "INSERT INTO telemetry (resource_id, session_id, event_type, url, screen_res, payload, timestamp) "
+            f"VALUES ('OT-1', 's1', 'heatmap_batch', '{url}', '1280x800', "
+            f"'{{\"clicks\": [{{\"x\": {x}, \"y\": 30, \"t\": 100}}]}}', '2026-01-01 12:00:00')"
+        )
+    migrations.migrate_clickhouse()
+
+    # 0004 can't filter query strings in SQL, so both URLs share the bare path as their key
+    (page,) = asyncio.run(analytics.get_heatmap_urls(resource_id="OT-1"))
+    assert (page["host"], page["canonical_path"], page["clicks"]) == ("a.io", "/p", 2)
+    bins = asyncio.run(analytics.get_heatmap_bins(
+        resource_id="OT-1", host=page["host"], canonical_path=page["canonical_path"], cols=4, row_px=20
+    ))
+    assert bins["viewports"]["desktop"]["matrix"] == [[0.0] * 4, [0.0, 1.0, 0.0, 1.0]]
+    assert clickhouse.query("SELECT count() FROM telemetry WHERE event_type = 'heatmap_batch'").first_row == (0,)
@@ -0,0 +1,271 @@
+"""Tests for the telemetry ingest pipeline."""
+import asyncio
+import datetime
+import gzip
+
+import pytest
+import zstandard
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from backend.app.ingest.admission import AdmissionController, event_priority
+from backend.app.ingest.bots import BotClassifier
+from backend.app.ingest.buffer import IngestBuffer, TELEMETRY_COLUMNS
+from backend.app.ingest.compression import decompress_body
+from backend.app.ingest.dedup import EventDeduplicator
+from backend.app.ingest.geoip import GeoIPResolver
+from backend.app.ingest.heatmap import decode_clicks
+from backend.app.ingest.proxy import TrustedProxies
+from backend.app.ingest.schema import decode_beacon
+from backend.app.ingest.sampling import in_sample
+from backend.app.ingest.spool import DiskSpool
+from backend.app.ingest.urls import ref_domain, split_url
+from backend.app.ingest.useragent import parse_user_agent
+
+
+def test_buffer_flushes_columnar_batches():
+    """Rows queued across requests are written as one column-oriented insert."""
+    buffer = IngestBuffer("telemetry", ["a", "b"], max_rows=10, max_age=1, max_queue=100)
+    batches = []
+    buffer._insert = batches.append
+
+    buffer.add(["x", 1])
+    buffer.add(["y", 2])
+    assert asyncio.run(buffer.flush()) == 2
+    assert batches == [[["x", "y"], [1, 2]]]
+    assert buffer.stats()["queued"] == 0
+
+
+def test_buffer_rejects_rows_when_full():
+    buffer = IngestBuffer("telemetry", ["a"], max_rows=10, max_age=1, max_queue=1)
+    assert buffer.add(["x"])
+    assert not buffer.add(["y"])
+    assert buffer.stats()["dropped_rows"] == 1
+
+
+def test_buffer_keeps_rows_on_failed_flush():
+    buffer = IngestBuffer("telemetry", ["a"], max_rows=10, max_age=1, max_queue=10)
+
+    def fail(data):
+        raise RuntimeError("clickhouse down")
+
+    buffer._insert = fail
+    buffer.add(["x"])
+    assert asyncio.run(buffer.flush()) == 0
+    assert buffer.stats()["queued"] == 1
+    assert buffer.stats()["failed_flushes"] == 1
+
+
+def test_buffer_keeps_running_when_spool_is_unusable(tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    spool = DiskSpool(str(blocker / "spool"), segment_bytes=1024, max_bytes=1024 * 1024)
+    buffer = IngestBuffer("telemetry", ["a"], max_rows=10, max_age=0.01, max_queue=10, spool=spool)
+    batches = []
+
+    def fail(data):
+        raise RuntimeError("clickhouse down")
+
+    async def run():
+        buffer._insert = fail
+        buffer.start()
+        buffer.add(["x"])
+        await asyncio.sleep(0.05)
+        buffer._insert = batches.append
+        buffer._retry_at = 0
+        buffer.add(["y"])
+        await asyncio.sleep(0.1)
+        await buffer.stop()
+
+    asyncio.run(run())
+    # The failed batch stayed in memory once the spool turned out unusable
+    assert [value for batch in batches for value in batch[0]] == ["x", "y"]
+    assert buffer.stats()["spool_error"]
+
+
+def test_full_buffer_spills_to_spool_on_flush_in_order(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes=1024, max_bytes=1024 * 1024)
+    buffer = IngestBuffer("telemetry", ["a"], max_rows=10, max_age=0, max_queue=2, spool=spool)
+    batches = []
+    buffer._insert = batches.append
+
+    for value in ("a", "b", "c"):
+        assert buffer.add([value])
+    assert not spool.pending()
+    asyncio.run(buffer.flush())
+    while asyncio.run(buffer.replay()):
+        pass
+    assert [value for batch in batches for value in batch[0]] == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("gzip", gzip.compress),
+    ("zstd", zstandard.ZstdCompressor().compress),
+])
+def test_compressed_bodies_are_decoded_within_limit(encoding, compress):
+    body = b'{"rid": "OT-1", "type": "page_view"}'
+    assert decompress_body(compress(body), encoding, limit=1024) == body
+
+    with pytest.raises(HTTPException) as exc:
+        decompress_body(compress(b"0" * 1_000_000), encoding, limit=1024)
+    assert exc.value.status_code == 413
+
+
+def test_failed_batches_are_spooled_and_replayed_in_order(tmp_path):
+    spool = DiskSpool(str(tmp_path), segment_bytes=1024, max_bytes=1024 * 1024)
+    buffer = IngestBuffer("telemetry", ["a", "ts"], max_rows=10, max_age=0, max_queue=10, spool=spool)
+    ts = datetime.datetime(2026, 1, 1, 12, 0)
+
+    def fail(data):
+        raise RuntimeError("clickhouse down")
+
+    buffer._insert = fail
+    buffer.add(["first", ts])
+    asyncio.run(buffer.flush())
+    buffer.add(["second", ts])
+    asyncio.run(buffer.flush())
+    assert spool.pending()
+
+    batches = []
+    buffer._insert = batches.append
+    while asyncio.run(buffer.replay()):
+        pass
+    assert batches == [[["first", "second"], [ts, ts]]]
+    assert not spool.pending()
+
+
+def test_beacon_decodes_to_row_in_column_order():
+    body = b'{"rid": "OT-1", "sid": "s1", "type": "click", "url": "https://a.io/", "meta": {"id": "buy"}}'
+    ts = datetime.datetime(2026, 1, 1)
+    row = decode_beacon(body).row("Mozilla/5.0", "10.0.0.1", ts)
+
+    assert len(row) == len(TELEMETRY_COLUMNS)
+    values = dict(zip(TELEMETRY_COLUMNS, row))
+    assert values["resource_id"] == "OT-1"
+    assert values["session_id"] == "s1"
+    assert values["event_type"] == "click"
+    assert values["payload"] == '{"id": "buy"}'
+    assert values["timestamp"] == ts
+
+
+def test_malformed_or_oversized_beacons_are_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_beacon(b'{"rid": "OT-1", "url": "' + b"a" * 5000 + b'"}')
+    assert exc.value.status_code == 422
+
+    with pytest.raises(HTTPException) as exc:
+        decode_beacon(b'{"rid": ')
+    assert exc.value.status_code == 400
+
+
+def test_user_agents_are_parsed_into_device_os_browser():
+    iphone = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Version/17.0 Mobile/15E148 Safari/604.1"
+    edge = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36 Edg/120.0"
+    assert parse_user_agent(iphone) == ("Mobile", "iOS", "Safari")
+    assert parse_user_agent(edge) == ("Desktop", "Windows", "Edge")
+    assert parse_user_agent("") == ("Desktop", "Other", "Other")
+
+
+def test_geoip_without_database_resolves_to_unknown(tmp_path):
+    resolver = GeoIPResolver(str(tmp_path / "missing.mmdb"), cache_size=16, check_interval=60)
+    assert resolver.lookup("8.8.8.8") == ("", "")
+    assert resolver.lookup("not-an-ip") == ("", "")
+    assert resolver.location("8.8.8.8") is None
+
+
+def test_urls_are_split_into_host_path_and_canonical_path():
+    url = "https://Shop.example.com/catalog/shoes/?utm_source=fb&size=42&fbclid=abc&color=red#reviews"
+    assert split_url(url) == ("shop.example.com", "/catalog/shoes", "/catalog/shoes?color=red&size=42")
+    assert split_url("https://example.com") == ("example.com", "/", "/")
+    assert ref_domain("https://www.Google.com/search?q=x") == "google.com"
+    assert ref_domain("") == ""
+
+
+def test_bot_classifier_checks_agent_ip_ranges_and_rate(tmp_path):
+    ranges = tmp_path / "ranges.txt"
+    ranges.write_text("# crawler hosts\n66.249.64.0/19\n2001:db8::/32\nnot-a-range\n")
+    classifier = BotClassifier(str(ranges), max_events_per_minute=5, max_sessions=10)
+    chrome = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+    assert classifier.classify("Mozilla/5.0 (compatible; Googlebot/2.1)", "10.0.0.1", "a")
+    assert classifier.classify("Mozilla/5.0 HeadlessChrome/120.0", "10.0.0.1", "b")
+    assert classifier.classify("Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)", "10.0.0.1", "b")
+    assert classifier.classify("AdsBot-Google (+http://www.google.com/adsbot.html)", "10.0.0.1", "b")
+    # A Cubot phone and the YandexSearch app are real visitors
+    assert not classifier.classify(
+        "Mozilla/5.0 (Linux; Android 10; CUBOT P30) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Mobile Safari/537.36", "10.0.0.1", "f")
+    assert not classifier.classify(
+        "Mozilla/5.0 (Linux; Android 12; SM-A525F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 "
+        "YandexSearch/23.91 YandexSearchBrowser/23.91 Mobile Safari/537.36", "10.0.0.1", "g")
+    assert classifier.classify(chrome, "66.249.70.3", "c")
+    assert classifier.classify(chrome, "2001:db8::1", "d")
+    assert not classifier.classify(chrome, "10.0.0.1", "e", events=5)
+    assert classifier.classify(chrome, "10.0.0.1", "e")
+
+
+def test_client_ip_trusts_forwarding_headers_only_from_proxies():
+    def request(peer, **headers):
+        return Request({"type": "http", "client": (peer, 1234),
+                        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]})
+
+    proxies = TrustedProxies("172.16.0.0/12, ::1/128, bogus")
+    assert proxies.client_ip(request("172.18.0.5", x_forwarded_for="203.0.113.9")) == "203.0.113.9"
+    # Spoofed leftmost hops are skipped: the first untrusted hop from the right is the visitor
+    assert proxies.client_ip(request("172.18.0.5", x_forwarded_for="1.1.1.1, 203.0.113.9, 172.18.0.1")) == "203.0.113.9"
+    assert proxies.client_ip(request("::1", x_real_ip="198.51.100.7")) == "198.51.100.7"
+    assert proxies.client_ip(request("203.0.113.50", x_forwarded_for="1.1.1.1")) == "203.0.113.50"
+    assert proxies.client_ip(request("172.18.0.5")) == "172.18.0.5"
+
+
+def test_sampling_is_deterministic_per_session():
+    sessions = [f"s{i}" for i in range(10000)]
+    kept = [s for s in sessions if in_sample(s, 0.25)]
+    assert 2200 < len(kept) < 2800
+    assert kept == [s for s in sessions if in_sample(s, 0.25)]
+    assert all(in_sample(s, 1.0) for s in sessions[:100])
+
+
+def test_admission_sheds_low_priority_before_page_views():
+    controller = AdmissionController(resource_rate=0.001, resource_burst=10, ip_rate=0.001, ip_burst=2,
+                                     max_ips=10, sync_interval=1)
+    clicks = sum(controller.admit("OT-1", event_priority("click")) for _ in range(10))
+    views = sum(controller.admit("OT-1", event_priority("page_view")) for _ in range(10))
+    assert clicks == 5
+    assert views == 5
+
+    pressured = AdmissionController(resource_rate=1000, resource_burst=1000, ip_rate=1, ip_burst=1,
+                                    max_ips=10, sync_interval=1, pressure=lambda: 0.6)
+    assert not pressured.admit("OT-1", event_priority("heatmap_batch"))
+    assert pressured.admit("OT-1", event_priority("page_exit"))
+    assert pressured.admit_ip("10.0.0.1") and not pressured.admit_ip("10.0.0.1")
+
+
+def test_deduplicator_drops_events_seen_in_window():
+    dedup = EventDeduplicator(window=600, capacity=1000, error_rate=0.001)
+    assert not dedup.seen("OT-1", "e1")
+    # Checking alone doesn't remember the id: only recorded (queued) events count
+    assert not dedup.seen("OT-1", "e1")
+    dedup.record("OT-1", "e1")
+    assert dedup.seen("OT-1", "e1")
+    assert not dedup.seen("OT-2", "e1")
+    dedup.record("OT-1", "")
+    assert not dedup.seen("OT-1", "")
+    # Still remembered after one rotation, forgotten after two
+    for i in range(1000):
+        dedup.record("OT-1", f"fill-{i}")
+    assert dedup.seen("OT-1", "e1")
+    for i in range(1000):
+        dedup.record("OT-1", f"more-{i}")
+    assert not dedup.seen("OT-1", "e1")
+
+
+def test_heatmap_clicks_decode_compact_and_legacy_batches():
+    # x=500, y=300, t=10; then x=1000, y=120 (dy=-180), t=25 (dt=15), as encoded by the SDK
+    width, clicks = decode_clicks(b'{"v":1,"w":1280,"c":"9APYBAroB-cCDw"}')
+    assert width == 1280
+    assert clicks == [(0.5, 300, 10), (1.0, 120, 25)]
+
+    assert decode_clicks(b'{"clicks":[{"x":1.5,"y":-4,"t":7}]}') == (0, [(1.0, 0, 7)])
+    with pytest.raises(HTTPException):
+        decode_clicks(b'{"v":1,"c":"_w"}')
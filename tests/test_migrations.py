@@ -0,0 +1,51 @@
+"""Tests for the ClickHouse rollups, run against embedded ClickHouse (chdb) when it is installed."""
+import datetime
+
+from backend.app import migrations
+from backend.app.migrations import SESSIONS_SELECT
+
+
+def test_session_source_comes_from_the_first_event(clickhouse):
+    start = datetime.datetime(2026, 1, 1, 12, 0)
+    rows = [
+        # Inserted out of order: the landing page is not the first row stored
+        ("s1", "https://a.io/pricing", "", "a.io", start + datetime.timedelta(minutes=2)),
+        ("s1", "https://a.io/", "", "google.com", start),
+        ("s1", "https://a.io/docs", "", "a.io", start + datetime.timedelta(minutes=1)),
+        ("s2", "https://a.io/", "", "", start),
+        ("s2", "https://a.io/docs", "", "a.io", start + datetime.timedelta(minutes=1)),
+        ("s3", "https://a.io/?utm_source=news", "news", "", start),
+        ("s3", "https://a.io/docs", "", "a.io", start + datetime.timedelta(minutes=1)),
+    ]
+    for session_id, url, utm_source, ref, ts in rows:
+        clickhouse.command(
+            "INSERT INTO telemetry (resource_id, session_id, event_type, url, utm_source, ref_domain, timestamp) "
+            f"VALUES ('OT-1', '{session_id}', 'page_view', '{url}', '{utm_source}', '{ref}', '{ts}')"
+        )
+
+    expected = [("s1", "google.com"), ("s2", "Direct"), ("s3", "news")]
+    # The backfill query of the migration and the materialized view of init.sql agree
+    assert clickhouse.query(
+        f"SELECT session_id, finalizeAggregation(source) FROM ({SESSIONS_SELECT}) ORDER BY session_id"
+    ).result_rows == expected
+    assert clickhouse.query(
+        "SELECT session_id, argMinMerge(source) FROM sessions GROUP BY session_id ORDER BY session_id"
+    ).result_rows == expected
+
+
+def test_cohorts_are_rebuilt_with_countries_instead_of_languages(clickhouse, monkeypatch):
+    monkeypatch.setattr(migrations, "get_clickhouse_client", lambda: clickhouse)
+    clickhouse.command(
+        "INSERT INTO telemetry (resource_id, session_id, event_type, lang, country, timestamp) VALUES "
+        "('OT-1', 's1', 'page_view', 'en', 'DE', '2026-01-02 12:00:00'), "
+        "('OT-1', 's2', 'page_view', 'en', '', '2026-01-01 12:00:00')"
+    )
+    # Cohorts the lang-based view wrote before GeoIP enrichment
+    clickhouse.command(
+        "INSERT INTO user_cohorts VALUES ('OT-1', 's1', '2026-01-02', '', 'en', ''), ('OT-1', 's2', '2026-01-01', '', 'en', '')"
+    )
+    migrations.migrate_clickhouse()
+
+    assert clickhouse.query(
+        "SELECT identity, first_event_date, country FROM user_cohorts FINAL ORDER BY identity"
+    ).result_rows == [("s1", "2026-01-02", "DE"), ("s2", "2026-01-01", "")]
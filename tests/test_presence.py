@@ -0,0 +1,58 @@
+"""Tests for online presence kept in Redis sorted sets."""
+import asyncio
+import datetime
+import json
+
+import fakeredis.aioredis
+import pytest
+
+from backend.app import presence
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(presence, "redis_client", client)
+    monkeypatch.setattr(presence, "touch_session", client.register_script(presence.touch_session.script))
+    return client
+
+
+def test_sessions_are_counted_per_resource_and_page(redis):
+    async def run():
+        now = datetime.datetime.now()
+        await presence.touch("OT-1", "s1", "1.1.1.1", "https://a.io/x", "/x", now, fbclid="fb")
+        await presence.touch("OT-1", "s2", "1.1.1.2", "https://a.io/x", "/x", now)
+        # s1 moves on: it leaves /x and keeps its click id
+        await presence.touch("OT-1", "s1", "1.1.1.1", "https://a.io/y", "/y", now)
+        await presence.touch("OT-2", "s3", "1.1.1.3", "https://b.io/", "/", now - datetime.timedelta(hours=1))
+        session = json.loads(await redis.get("ot:active:OT-1:s1"))
+        return (
+            await presence.online_count("OT-1"), await presence.online_count(), await presence.online_count("OT-2"),
+            await presence.online_pages("OT-1"), session,
+        )
+
+    one, everyone, stale, pages, session = asyncio.run(run())
+    assert (one, everyone, stale) == (2, 2, 0)
+    assert sorted(pages, key=lambda p: p["path"]) == [{"path": "/x", "online": 1}, {"path": "/y", "online": 1}]
+    assert session["fbclid"] == "fb" and session["path"] == "/y"
+
+
+def test_trim_drops_sessions_and_pages_past_the_ttl(redis):
+    async def run():
+        old = datetime.datetime.now() - datetime.timedelta(seconds=presence.SESSION_TTL + 60)
+        await presence.touch("OT-1", "s1", "1.1.1.1", "https://a.io/", "/", old)
+        await presence.touch("OT-2", "s2", "1.1.1.2", "https://b.io/x", "/x", datetime.datetime.now())
+        await presence.trim()
+        first = (
+            await redis.zcard(presence.online_key()), await redis.exists(presence.page_key("OT-1", "/")),
+            sorted(await redis.smembers(presence.RESOURCES_KEY)),
+        )
+        await presence.trim()
+        return first, sorted(await redis.smembers(presence.RESOURCES_KEY))
+
+    (online, old_page, resources), after = asyncio.run(run())
+    assert online == 1
+    assert not old_page
+    # A resource is forgotten once a trim finds none of its pages left
+    assert resources == [b"OT-1", b"OT-2"]
+    assert after == [b"OT-2"]
@@ -0,0 +1,128 @@
+"""Tests for serving the SDK and the public event rules."""
+import datetime
+import email.utils
+import gzip
+import time
+
+import brotli
+import fakeredis.aioredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app import sdk_cache
+from backend.app.database import get_db
+from backend.app.registry import resource_registry
+from backend.app.routers import events, sdk
+from backend.app.schemas import schemas
+from backend.app.sdk_build import ScriptArtifact, negotiate
+from backend.app.sdk_cache import RulesDocument, etag_matches
+
+
+def test_negotiate_prefers_brotli_then_gzip_and_honours_q_values():
+    assert negotiate("gzip, deflate, br") == "br"
+    assert negotiate("gzip;q=1.0, br;q=0") == "gzip"
+    assert negotiate("br;q=0.5, gzip") == "br"
+    assert negotiate("*") == "br"
+    assert negotiate("*;q=0, identity") == "identity"
+    assert negotiate(None) == "identity"
+    assert negotiate("br;q=oops, gzip") == "gzip"
+    assert negotiate("br, gzip", available={"identity": b"", "gzip": b""}) == "gzip"
+
+
+def test_script_artifact_variants_decode_to_the_minified_source():
+    artifact = ScriptArtifact("function  add ( a , b ) {\n  // sum\n  return a + b;\n}\n" * 50)
+    body = artifact.variants["identity"]
+    assert b"// sum" not in body
+    assert gzip.decompress(artifact.variants["gzip"]) == body
+    assert brotli.decompress(artifact.variants["br"]) == body
+    # Every encoding has its own strong ETag
+    assert len(set(artifact.etags.values())) == len(artifact.variants)
+    assert artifact.select("gzip") == ("gzip", artifact.variants["gzip"], artifact.etags["gzip"])
+
+
+def test_etag_matching_accepts_lists_weak_tags_and_wildcard():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_rules_document_revalidates_by_etag_before_date():
+    doc = RulesDocument(b"[]", modified=1_700_000_000.5)
+    assert doc.not_modified(doc.etag, None)
+    later = email.utils.formatdate(1_700_000_100, usegmt=True)
+    earlier = email.utils.formatdate(1_699_999_000, usegmt=True)
+    assert doc.not_modified(None, doc.last_modified)
+    assert doc.not_modified(None, later)
+    assert not doc.not_modified(None, earlier)
+    assert not doc.not_modified(None, "not a date")
+    # If-None-Match wins over If-Modified-Since
+    assert not doc.not_modified('"other"', later)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(sdk_cache, "redis_client", fakeredis.aioredis.FakeRedis())
+    monkeypatch.setattr(sdk_cache, "config_versions", sdk_cache.ConfigVersions())
+    monkeypatch.setattr(events, "rules_cache", sdk_cache.RulesCache("rules", ttl=60))
+    resource = schemas.Resource(id=1, uid="OT-1", name="site", type="Website", created_at=datetime.datetime.now())
+    monkeypatch.setattr(resource_registry, "_by_uid", {"OT-1": resource})
+    # Unknown ids don't trigger a reload from the database
+    monkeypatch.setattr(resource_registry, "_last_refresh", time.monotonic())
+
+    class Rows:
+        def scalars(self):
+            return self
+
+        def all(self):
+            return []
+
+    class Session:
+        async def execute(self, query):
+            return Rows()
+
+    async def db():
+        yield Session()
+
+    app = FastAPI()
+    app.include_router(sdk.router)
+    app.include_router(events.router)
+    app.dependency_overrides[get_db] = db
+    return TestClient(app)
+
+
+def test_core_script_is_precompressed_and_answers_304(client):
+    res = client.get(sdk.CORE_PATH, headers={"Accept-Encoding": "br, gzip"})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "br"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert "immutable" in res.headers["cache-control"]
+
+    again = client.get(sdk.CORE_PATH, headers={"Accept-Encoding": "br, gzip", "If-None-Match": res.headers["etag"]})
+    assert again.status_code == 304
+    # The brotli ETag doesn't validate the gzip variant
+    gzipped = client.get(sdk.CORE_PATH, headers={"Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]})
+    assert gzipped.status_code == 200
+
+
+def test_bootstrap_is_cached_per_resource_and_revalidated(client):
+    res = client.get("/sdk/t.js?id=OT-1", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert "__ot_config" in res.text
+    assert sdk.CORE_PATH in res.text
+    assert "max-age" in res.headers["cache-control"]
+    assert client.get("/sdk/t.js?id=OT-1", headers={"Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]}).status_code == 304
+    assert client.get("/sdk/t.js?id=OT-404").text == "// Resource not found"
+
+
+def test_public_rules_answer_conditional_requests(client):
+    res = client.get("/api/v1/rules/OT-1")
+    assert res.status_code == 200
+    assert res.json() == []
+    assert res.headers["cache-control"] == "public, no-cache"
+
+    assert client.get("/api/v1/rules/OT-1", headers={"If-None-Match": res.headers["etag"]}).status_code == 304
+    assert client.get("/api/v1/rules/OT-1", headers={"If-Modified-Since": res.headers["last-modified"]}).status_code == 304
+    assert client.get("/api/v1/rules/OT-1", headers={"If-None-Match": '"stale"'}).status_code == 200